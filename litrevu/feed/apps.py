@@ -1,6 +1,37 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def recreate_search_triggers(sender, using, **kwargs):
+    from feed.search import ensure_search_triggers
+
+    ensure_search_triggers(using)
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """
+    Tune every new SQLite connection with the pragmas of `settings.SQLITE_PRAGMAS`, skipping the empty ones.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            if value != "":
+                cursor.execute(f"PRAGMA {name} = {value}")
 
 
 class FeedConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "feed"
+
+    def ready(self):
+        # Connect the signal receivers keeping derived data in sync with posts
+        from feed import signals  # noqa: F401
+
+        # Restore the full-text index triggers after migrations rebuilding the post tables
+        post_migrate.connect(recreate_search_triggers, sender=self)
+
+        # Apply the busy timeout and, when configured, the write-ahead log to SQLite connections
+        connection_created.connect(apply_sqlite_pragmas)
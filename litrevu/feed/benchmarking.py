@@ -0,0 +1,129 @@
+import importlib
+import statistics
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test.utils import override_settings
+from django.urls import clear_url_caches
+
+
+def percentile(values, percent):
+    """
+    Return the `percent`-th percentile of a list of values (nearest-rank method).
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(int(round(percent / 100 * len(ordered))) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(latencies, elapsed=None):
+    """
+    Summarize request latencies, in milliseconds.
+
+    Parameters:
+    latencies: list of float
+        Latency of each request, in seconds.
+    elapsed: float, optional
+        Wall-clock duration of the whole run, in seconds, used to compute the throughput.
+
+    Returns:
+    dict
+    """
+    milliseconds = [latency * 1000 for latency in latencies]
+    summary = {
+        'requests': len(milliseconds),
+        'mean_ms': round(statistics.fmean(milliseconds), 3) if milliseconds else 0.0,
+        'p50_ms': round(percentile(milliseconds, 50), 3),
+        'p95_ms': round(percentile(milliseconds, 95), 3),
+        'p99_ms': round(percentile(milliseconds, 99), 3),
+    }
+    if elapsed:
+        summary['throughput_rps'] = round(len(milliseconds) / elapsed, 1)
+    return summary
+
+
+def reload_urlconf():
+    """
+    Re-import the root URLconf, so that the views it selects from the settings are picked again.
+    """
+    clear_url_caches()
+    urlconf = sys.modules.get(settings.ROOT_URLCONF)
+    if urlconf is not None:
+        importlib.reload(urlconf)
+
+
+def allow_test_client():
+    """
+    Accept the `testserver` host the test clients send their requests to.
+    """
+    return override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'])
+
+
+@contextmanager
+def use_async_views(enabled):
+    """
+    Route the feed, posts and subscriptions pages to their async (or sync) views for the duration of the block.
+    """
+    with override_settings(ASYNC_VIEWS=enabled):
+        reload_urlconf()
+        try:
+            yield
+        finally:
+            clear_url_caches()
+    reload_urlconf()
+
+
+def measure_requests(send, iterations, warmup=0, expected_status=200):
+    """
+    Time a request scenario and record its SQL query count and peak Python memory.
+
+    Parameters:
+    send: callable
+        Called with the iteration number, sends one request and returns the response.
+    iterations: int
+        Number of measured requests.
+    warmup: int
+        Number of requests sent before measuring, to fill caches.
+    expected_status: int
+        Status code of a successful response; other codes are counted as errors.
+
+    Returns:
+    dict
+        The latency summary, `queries_p50`, `queries_max`, `peak_memory_kb` and `errors`.
+    """
+    errors = 0
+    for index in range(warmup):
+        send(index)
+
+    latencies, queries = [], []
+    for index in range(warmup, warmup + iterations):
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            response = send(index)
+            latencies.append(time.perf_counter() - start)
+        queries.append(len(context))
+        errors += response.status_code != expected_status
+
+    # Measure memory on a separate request, tracing would distort the latencies
+    tracemalloc.start()
+    try:
+        send(warmup + iterations)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    summary = summarize(latencies)
+    summary.update({
+        'queries_p50': percentile(queries, 50),
+        'queries_max': max(queries, default=0),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'errors': errors,
+    })
+    return summary
@@ -0,0 +1,171 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from feed.models import REVIEW
+from feed.models import TICKET
+from feed.pagination import load_posts
+from feed.replicas import is_reading_from_replica
+from feed.replicas import read_from_primary
+
+logger = logging.getLogger(__name__)
+
+SNIPPETS = {
+    TICKET: 'snippets/ticket_snippet.html',
+    REVIEW: 'snippets/review_snippet.html',
+}
+
+
+class FragmentCacheStats:
+    """
+    Hit and miss counters of the rendered-fragment cache for the current process.
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def reset(self):
+        self.hits = 0
+        self.misses = 0
+
+
+stats = FragmentCacheStats()
+
+
+def post_version_key(content_type, pk):
+    return f"feed:version:{content_type.lower()}:{pk}"
+
+
+def feed_version_key(user_id):
+    return f"feed:version:user:{user_id}"
+
+
+def author_version_key(user_id):
+    return f"feed:version:author:{user_id}"
+
+
+def bump_version(key):
+    """
+    Increment a version counter, making every fragment keyed on its previous value unreachable.
+
+    Missing counters are initialized from the clock rather than from 1, so that a counter
+    evicted from the cache can never come back to a value an old fragment was stored under.
+    """
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def get_versions(keys):
+    """
+    Read several version counters at once, initializing the missing ones.
+
+    Returns:
+    dict
+        The current value of each key.
+    """
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return versions
+
+
+def bump_post_version(content_type, pk):
+    """
+    Invalidate the cached fragments of a ticket or review (and, for a ticket, of its reviews).
+    """
+    bump_version(post_version_key(content_type, pk))
+
+
+def bump_feed_version(user_id):
+    """
+    Invalidate the cached fragments of the feed of a user, e.g. after the follow graph changed.
+    """
+    bump_version(feed_version_key(user_id))
+
+
+def bump_author_version(user_id):
+    """
+    Mark the posts of an author as changed, e.g. after one of them was edited or deleted.
+    """
+    bump_version(author_version_key(user_id))
+
+
+def get_fragment_key(post, viewer):
+    """
+    Build the cache key of the fragment of `post` as seen by `viewer`.
+
+    The key embeds the versions of the viewer's feed, of the post and, for a review, of the
+    ticket it embeds, along with the per-viewer flags the snippets branch on.
+    """
+    keys = [feed_version_key(viewer.pk), post_version_key(post.content_type, post.pk)]
+    if post.content_type == TICKET:
+        flags = f"reviewed={int(bool(getattr(post, 'is_reviewed', False)))}"
+    else:
+        keys.append(post_version_key(TICKET, post.ticket_id))
+        flags = ""
+    versions = get_versions(keys)
+    version = ".".join(str(versions[key]) for key in keys)
+    return f"feed:fragment:{post.content_type.lower()}:{post.pk}:{viewer.pk}:{version}:{flags}"
+
+
+def render_post(post, viewer):
+    """
+    Render the snippet of a feed post, reusing the cached fragment when it is still current.
+
+    A post read from the replica may predate a write whose version is already part of its key:
+    on a miss, it is then reloaded from the primary before being rendered and cached.
+
+    Fragments are only cached with a cache shared by all the server processes (`SHARED_CACHE`):
+    the version counters bumped by one process must invalidate the fragments of the others.
+
+    Parameters:
+    post: Ticket or Review
+        A post annotated with `content_type`, as loaded by `feed.pagination.load_posts`.
+    viewer: User object
+        The user the feed is rendered for.
+
+    Returns:
+    str
+        The rendered HTML fragment.
+    """
+    if not settings.SHARED_CACHE:
+        return render_to_string(SNIPPETS[post.content_type], {'post': post, 'user': viewer})
+
+    from_replica = is_reading_from_replica()
+    key = get_fragment_key(post, viewer)
+    fragment = cache.get(key)
+    if fragment is not None:
+        stats.hits += 1
+        return fragment
+
+    stats.misses += 1
+    with read_from_primary():
+        if from_replica:
+            posts = load_posts([(post.content_type, post.pk, post.time_create)], viewer_id=viewer.pk)
+            if not posts:
+                # Deleted on the primary in the meantime
+                return ""
+            post = posts[0]
+            key = get_fragment_key(post, viewer)
+        fragment = render_to_string(SNIPPETS[post.content_type], {'post': post, 'user': viewer})
+    cache.set(key, fragment, settings.FEED_FRAGMENT_CACHE_TIMEOUT)
+    return fragment
+
+
+def log_stats():
+    """
+    Log the hit ratio of the fragment cache since the process started.
+    """
+    logger.debug("Feed fragment cache: %d hits, %d misses, hit ratio %.2f",
+                 stats.hits, stats.misses, stats.ratio)
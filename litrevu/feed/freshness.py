@@ -0,0 +1,95 @@
+from hashlib import sha256
+
+from django.conf import settings
+from django.contrib import messages
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from feed.fragments import author_version_key
+from feed.fragments import get_versions
+
+
+def make_etag(*parts):
+    """
+    Hash the parts describing the state of a response into an ETag value.
+    """
+    return sha256("|".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def get_authors_etag(author_ids, *parts):
+    """
+    Compute the ETag of a page listing the posts of some authors.
+
+    The ETag combines the version counters of the authors, which are bumped whenever one of
+    their posts is created, edited or deleted, see `feed.signals`. No query is made.
+
+    Parameters:
+    author_ids: iterable of Integers
+        The authors whose tickets and reviews the page lists.
+    parts: str
+        Anything else the response depends on, e.g. the cursor of the page.
+
+    Returns:
+    str
+    """
+    author_ids = sorted(set(author_ids))
+    keys = [author_version_key(author_id) for author_id in author_ids]
+    versions = get_versions(keys)
+    return make_etag(",".join(f"{author_id}:{versions[key]}" for author_id, key in zip(author_ids, keys)),
+                     *parts)
+
+
+def get_feed_etag(user_id, followed_ids, *parts):
+    """
+    Compute the ETag of the feed of a user, made of their posts and of the posts of the users they follow.
+
+    See `get_authors_etag` for the parameters.
+
+    Returns:
+    str
+    """
+    return get_authors_etag([user_id, *followed_ids], user_id, *parts)
+
+
+def get_request_parts(request):
+    """
+    List what every HTML page depends on besides its content: the user and the CSRF cookie.
+
+    Forms embed a token derived from the CSRF cookie, so a page must not be revalidated once
+    the cookie was rotated (e.g. on login).
+    """
+    return [request.user.pk, request.user.username, request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')]
+
+
+def has_pending_messages(request):
+    """
+    Tell whether messages are waiting to be displayed, without marking them as read.
+    """
+    return len(messages.get_messages(request)) > 0
+
+
+def conditional_page(get_etag):
+    """
+    Build the method decorator making a page answer `304 Not Modified` when unchanged.
+
+    It relies on Django's `condition` decorator. Only an ETag is sent: the pages change when a
+    post is edited or deleted, which no modification time reflects, so a client revalidating
+    with `If-Modified-Since` alone must get the page again. Responses are marked private and
+    must be revalidated, so browsers never display a stale page from their cache.
+
+    ETags are only sent with a cache shared by all the server processes (`SHARED_CACHE`): they
+    are made of version counters, which a process-local cache would not see bumped by the others.
+
+    Parameters:
+    get_etag: callable
+        Called with the request and the view arguments, returns the ETag of the page; None
+        disables the conditional response, e.g. when messages are pending.
+    """
+    def get_shared_etag(request, *args, **kwargs):
+        return get_etag(request, *args, **kwargs) if settings.SHARED_CACHE else None
+
+    def decorator(view):
+        view = condition(etag_func=get_shared_etag)(view)
+        return cache_control(private=True, no_cache=True)(view)
+
+    return method_decorator(decorator)
@@ -0,0 +1,192 @@
+import logging
+import posixpath
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from feed.models import Ticket
+from PIL import Image
+from PIL import ImageOps
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'variants'
+
+
+def has_transparency(image):
+    """
+    Tell whether a Pillow image carries an alpha channel or a transparent palette entry.
+    """
+    return image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def get_variant_name(name, width, extension):
+    """
+    Build the storage name of a variant of an image.
+
+    `tickets/cover.jpg` at 300 pixels in WebP becomes `tickets/variants/cover_300w.webp`.
+    """
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, VARIANTS_DIR, f"{stem}_{width}w.{extension}")
+
+
+def get_variant_names(name, fallback_extension='jpg'):
+    """
+    List the variants generated for an image.
+
+    Returns:
+    dict
+        `fallback` and, when WebP is enabled, `webp` map to lists of `(width, name)` tuples.
+    """
+    variants = {'fallback': [(width, get_variant_name(name, width, fallback_extension))
+                             for width in settings.TICKET_IMAGE_WIDTHS]}
+    if settings.TICKET_IMAGE_WEBP:
+        variants['webp'] = [(width, get_variant_name(name, width, 'webp')) for width in settings.TICKET_IMAGE_WIDTHS]
+    return variants
+
+
+def save_image(storage, name, image, image_format, overwrite):
+    """
+    Encode a Pillow image and store it under `name`, replacing any existing file when `overwrite` is set.
+    """
+    if storage.exists(name):
+        if not overwrite:
+            return
+        storage.delete(name)
+
+    buffer = BytesIO()
+    if image_format == 'JPEG':
+        image.save(buffer, 'JPEG', quality=85, optimize=True, progressive=True)
+    elif image_format == 'WEBP':
+        image.save(buffer, 'WEBP', quality=80, method=4)
+    else:
+        image.save(buffer, image_format, optimize=True)
+    storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def generate_variants(name, storage=default_storage, overwrite=True):
+    """
+    Generate the fixed-width thumbnails (and WebP copies) of an uploaded ticket image.
+
+    Images are never upscaled: a variant wider than the original keeps the original width.
+
+    Parameters:
+    name: str
+        Storage name of the original image, e.g. `ticket.image.name`.
+    storage: Storage
+        The storage holding the original and receiving the variants.
+    overwrite: bool
+        Whether existing variants are regenerated.
+
+    Returns:
+    list of str
+        The names of the variants.
+    """
+    with storage.open(name) as file:
+        with Image.open(file) as original:
+            transparent = has_transparency(original)
+            image = ImageOps.exif_transpose(original).convert('RGBA' if transparent else 'RGB')
+
+    # Keep transparency in PNG for the browsers without WebP support, use JPEG otherwise
+    fallback_format = 'PNG' if transparent else 'JPEG'
+    fallback_extension = 'png' if transparent else 'jpg'
+    variants = get_variant_names(name, fallback_extension)
+
+    generated = []
+    for width in settings.TICKET_IMAGE_WIDTHS:
+        thumbnail = image.copy()
+        thumbnail.thumbnail((width, width * 10))
+        for key, image_format in (('fallback', fallback_format), ('webp', 'WEBP')):
+            if key not in variants:
+                continue
+            variant_name = dict(variants[key])[width]
+            save_image(storage, variant_name, thumbnail, image_format, overwrite)
+            generated.append(variant_name)
+    return generated
+
+
+def generate_ticket_variants(ticket):
+    """
+    Generate the variants of the image of a ticket, if any.
+
+    Images are named after their content, so the existing variants of an image shared with
+    other tickets are kept. They are written through the default storage, which shares the media
+    directory but keeps the names derived from the original. Failures are logged rather than
+    raised: the original image is still served by the templates.
+    """
+    if not ticket.image:
+        return []
+    try:
+        return generate_variants(ticket.image.name, overwrite=False)
+    except (OSError, Image.DecompressionBombError):
+        logger.exception("Could not generate the variants of %s", ticket.image.name)
+        return []
+
+
+def get_srcsets(name, storage=default_storage):
+    """
+    Build the `srcset` attribute values of an image from its existing variants.
+
+    Returns:
+    dict or None
+        `fallback` and optionally `webp` srcset strings, or None when no variants were generated yet.
+    """
+    for extension in ('jpg', 'png'):
+        variants = get_variant_names(name, extension)
+        smallest_name = variants['fallback'][0][1]
+        if storage.exists(smallest_name):
+            return {key: ", ".join(f"{storage.url(variant_name)} {width}w" for width, variant_name in names)
+                    for key, names in variants.items()}
+    return None
+
+
+def get_all_variant_names(name):
+    """
+    List the names every variant of an image may have, whatever the format of its fallback.
+    """
+    names = set()
+    for extension in ('jpg', 'png'):
+        for variants in get_variant_names(name, extension).values():
+            names.update(variant_name for _, variant_name in variants)
+    return sorted(names)
+
+
+def delete_image(name, storage=default_storage):
+    """
+    Delete an image and its variants from the storage.
+    """
+    for file_name in [name, *get_all_variant_names(name)]:
+        storage.delete(file_name)
+
+
+def release_image(name, storage=default_storage):
+    """
+    Delete a ticket image and its variants, unless another ticket still references it.
+
+    Identical images share one file (see `feed.storage.ContentAddressedStorage`), so the tickets
+    referencing a file are counted before it is removed. Call it once the transaction dropping
+    the reference is committed, so that the count sees the final state.
+
+    A file modified less than `TICKET_IMAGE_RELEASE_GRACE` seconds ago is kept: an identical
+    upload refreshes the file before the ticket referencing it is saved, and would otherwise lose
+    its image. Such files are left to the `collect_orphaned_media` command.
+
+    Returns:
+    bool
+        Whether the image was deleted.
+    """
+    if not name or Ticket.objects.filter(image=name).exists():
+        return False
+    try:
+        modified = storage.get_modified_time(name)
+    except FileNotFoundError:
+        modified = None
+    if modified is not None and modified > timezone.now() - timedelta(seconds=settings.TICKET_IMAGE_RELEASE_GRACE):
+        logger.debug("Keeping the recently stored image %s", name)
+        return False
+    delete_image(name, storage)
+    return True
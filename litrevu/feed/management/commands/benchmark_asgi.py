@@ -0,0 +1,115 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.test import AsyncClient
+from django.test import Client
+from feed.benchmarking import allow_test_client
+from feed.benchmarking import summarize
+from feed.benchmarking import use_async_views
+from users.models import CustomUser
+
+DEFAULT_PATHS = ['/feed/', '/posts/', '/abonnements/']
+
+
+class Command(BaseCommand):
+    """
+    Compare the sync views served over WSGI with the async views served over ASGI.
+
+    Requests go through the full middleware stack: the sync run uses the WSGI test handler
+    from a pool of threads, the async run the ASGI test handler from concurrent tasks. Each
+    simulated client is logged in as the given user.
+    """
+    help = "Benchmark sync-WSGI against async-ASGI latency and throughput under concurrent clients."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help="User the requests are authenticated as.")
+        parser.add_argument('--requests', type=int, default=200, help="Number of requests per page and mode.")
+        parser.add_argument('--concurrency', type=int, default=10, help="Number of concurrent clients.")
+        parser.add_argument('--path', action='append', dest='paths', help="Page to request (repeatable).")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        try:
+            user = CustomUser.objects.get(username=options['username'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"The user {options['username']} does not exist.")
+
+        paths = options['paths'] or DEFAULT_PATHS
+        requests, concurrency = options['requests'], options['concurrency']
+
+        results = {}
+        with allow_test_client():
+            for path in paths:
+                with use_async_views(False):
+                    results.setdefault(path, {})['wsgi'] = self.run_wsgi(user, path, requests, concurrency)
+                with use_async_views(True):
+                    clients = [self.login(AsyncClient(), user) for _ in range(concurrency)]
+                    results[path]['asgi'] = asyncio.run(self.run_asgi(clients, path, requests))
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for path, modes in results.items():
+            for mode, summary in modes.items():
+                self.stdout.write(f"{path:<16} {mode:<5} " + "  ".join(f"{key}={value}"
+                                                                       for key, value in summary.items()))
+
+    def login(self, client, user):
+        client.force_login(user)
+        return client
+
+    def run_wsgi(self, user, path, requests, concurrency):
+        """
+        Send `requests` requests to `path` from `concurrency` threads through the WSGI handler.
+        """
+        clients = [self.login(Client(), user) for _ in range(concurrency)]
+        latencies, errors = [], 0
+
+        def worker(client, count):
+            nonlocal errors
+            for _ in range(count):
+                start = time.perf_counter()
+                response = client.get(path)
+                latencies.append(time.perf_counter() - start)
+                errors += response.status_code != 200
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for future in [executor.submit(worker, client, count)
+                           for client, count in zip(clients, self.split(requests, concurrency))]:
+                future.result()
+        summary = summarize(latencies, time.perf_counter() - start)
+        summary['errors'] = errors
+        return summary
+
+    async def run_asgi(self, clients, path, requests):
+        """
+        Send `requests` requests to `path` from one task per client through the ASGI handler.
+        """
+        latencies, errors = [], 0
+
+        async def worker(client, count):
+            nonlocal errors
+            for _ in range(count):
+                start = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - start)
+                errors += response.status_code != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client, count)
+                               for client, count in zip(clients, self.split(requests, len(clients)))))
+        summary = summarize(latencies, time.perf_counter() - start)
+        summary['errors'] = errors
+        return summary
+
+    @staticmethod
+    def split(total, parts):
+        """
+        Split `total` requests as evenly as possible between `parts` clients.
+        """
+        return [total // parts + (1 if index < total % parts else 0) for index in range(parts)]
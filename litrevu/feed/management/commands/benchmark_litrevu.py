@@ -0,0 +1,142 @@
+import json
+import platform
+from io import StringIO
+from tempfile import TemporaryDirectory
+
+import django
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from feed.benchmarking import allow_test_client
+from feed.benchmarking import measure_requests
+from feed.models import Review
+from feed.models import Ticket
+from feed.timeline import get_timeline_page
+from feed.views import FeedView
+from users.models import CustomUser
+from users.models import UserFollows
+
+
+class Command(BaseCommand):
+    """
+    Benchmark the main views of LITRevu at several scales.
+
+    For every scale, a throwaway test database is created and populated with `seed_litrevu`.
+    The views are then driven through the test client, logged in as the user following the
+    most people, and the latency percentiles, SQL query count and peak memory of every
+    scenario are reported as JSON, so that runs can be compared between commits.
+    """
+    help = "Benchmark the feed, posts, subscriptions and create/update views at several scales."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='100,1000',
+                            help="Comma-separated numbers of users to seed, one run per scale.")
+        parser.add_argument('--follows', type=float, default=20, help="Mean number of users each user follows.")
+        parser.add_argument('--tickets', type=float, default=10, help="Mean number of tickets per user.")
+        parser.add_argument('--reviews', type=float, default=10, help="Mean number of reviews per user.")
+        parser.add_argument('--images', type=float, default=0.0, help="Share of the tickets with an image.")
+        parser.add_argument('--iterations', type=int, default=30, help="Measured requests per scenario.")
+        parser.add_argument('--warmup', type=int, default=3, help="Unmeasured requests per scenario.")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the data generator.")
+        parser.add_argument('--label', default='', help="Free-form label stored with the results (e.g. a commit).")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of the standard output.")
+
+    def handle(self, *args, **options):
+        scales = [int(scale) for scale in options['scales'].split(',') if scale.strip()]
+        report = {
+            'label': options['label'],
+            'date': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'config': {key: options[key] for key in ('follows', 'tickets', 'reviews', 'images',
+                                                     'iterations', 'warmup', 'seed')},
+            'scales': {},
+        }
+
+        # Accept the test client host and keep the generated images out of the real media directory
+        with TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root), allow_test_client():
+            for scale in scales:
+                self.stderr.write(f"Benchmarking {scale} users...")
+                report['scales'][str(scale)] = self.run_scale(scale, options)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def run_scale(self, scale, options):
+        """
+        Seed a fresh test database with `scale` users and measure every scenario against it.
+        """
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        cache.clear()
+        try:
+            call_command('seed_litrevu', users=scale, follows=options['follows'], tickets=options['tickets'],
+                         reviews=options['reviews'], images=options['images'], seed=options['seed'],
+                         stdout=StringIO())
+            user = self.get_heaviest_user()
+            client = Client()
+            client.force_login(user)
+
+            return {
+                'users': scale,
+                'tickets': Ticket.objects.count(),
+                'reviews': Review.objects.count(),
+                'follows': UserFollows.objects.count(),
+                'user_following': user.following.count(),
+                'scenarios': {name: measure_requests(send, options['iterations'], options['warmup'], status)
+                              for name, send, status in self.get_scenarios(client, user)},
+            }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def get_heaviest_user(self):
+        """
+        Return the user following the most people, whose feed is the most expensive to build.
+        """
+        heaviest = (UserFollows.objects.values('user_id').annotate(following=Count('id'))
+                    .order_by('-following').first())
+        if heaviest is None:
+            return CustomUser.objects.order_by('id').first()
+        return CustomUser.objects.get(pk=heaviest['user_id'])
+
+    def get_scenarios(self, client, user):
+        """
+        List the `(name, send, expected_status)` scenarios measured at each scale.
+        """
+        followed_ids = list(user.following.values_list('followed_user', flat=True))
+        next_cursor = get_timeline_page(user.id, followed_ids, page_size=FeedView.paginate_by).next_cursor
+        own_ticket = Ticket.objects.create(user=user, title="Benchmark ticket")
+        other_ticket = Ticket.objects.exclude(user=user).order_by('-id').first() or own_ticket
+        own_review = Review.objects.create(user=user, ticket=other_ticket, rating=3, headline="Benchmark review")
+
+        return [
+            ('feed', lambda index: client.get(reverse('feed')), 200),
+            ('feed_next_page', lambda index: client.get(reverse('feed'), {'cursor': next_cursor or ''}), 200),
+            ('posts', lambda index: client.get(reverse('posts')), 200),
+            ('subscriptions', lambda index: client.get(reverse('abonnements')), 200),
+            ('ticket_create', lambda index: client.post(reverse('ticket-create'),
+                                                        {'title': f"Ticket {index}", 'description': ''}), 302),
+            ('ticket_update', lambda index: client.post(reverse('ticket-update', args=[own_ticket.pk]),
+                                                        {'title': f"Ticket {index}", 'description': ''}), 302),
+            ('ticket_and_review_create', lambda index: client.post(reverse('ticket-review-create'),
+                                                                   {'title': f"Ticket {index}", 'description': '',
+                                                                    'headline': f"Review {index}", 'rating': 4,
+                                                                    'body': ''}), 302),
+            ('review_create', lambda index: client.post(reverse('review-create', args=[other_ticket.pk]),
+                                                        {'headline': f"Review {index}", 'rating': 4, 'body': ''}),
+             302),
+            ('review_update', lambda index: client.post(reverse('review-update', args=[own_review.pk]),
+                                                        {'headline': f"Review {index}", 'rating': 2, 'body': ''}),
+             302),
+        ]
@@ -0,0 +1,68 @@
+import json
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from feed.benchmarking import allow_test_client
+from feed.benchmarking import measure_requests
+from users.models import CustomUser
+
+# Session engine and authentication backends of each compared configuration
+CONFIGURATIONS = {
+    'database': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'AUTHENTICATION_BACKENDS': ['django.contrib.auth.backends.ModelBackend'],
+    },
+    'cached': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+        'AUTHENTICATION_BACKENDS': ['users.backends.CachedModelBackend'],
+    },
+}
+
+
+class Command(BaseCommand):
+    """
+    Measure what the cached sessions and users save on every request to the feed.
+
+    The feed is requested with database sessions and users loaded from the database, then with
+    `cached_db` sessions and `CachedModelBackend`, enabled by the settings with a shared cache.
+    A new client logs in for each configuration, so that its session is stored by the engine
+    being measured.
+    """
+    help = "Compare the SQL queries and latency of the feed with database and cached sessions and users."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help="User the requests are authenticated as.")
+        parser.add_argument('--iterations', type=int, default=100, help="Measured requests per configuration.")
+        parser.add_argument('--warmup', type=int, default=3, help="Unmeasured requests per configuration.")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        try:
+            user = CustomUser.objects.get(username=options['username'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"The user {options['username']} does not exist.")
+
+        url = reverse('feed')
+        results = {}
+        with allow_test_client():
+            for name, overrides in CONFIGURATIONS.items():
+                # Start every configuration with cold caches
+                cache.clear()
+                with override_settings(**overrides):
+                    client = Client()
+                    client.force_login(user)
+                    results[name] = measure_requests(lambda index: client.get(url),
+                                                     options['iterations'], options['warmup'])
+                    client.logout()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for name, summary in results.items():
+            self.stdout.write(f"{name:<9} " + "  ".join(f"{key}={value}" for key, value in summary.items()))
+        saved = results['database']['queries_p50'] - results['cached']['queries_p50']
+        self.stdout.write(f"Queries saved per request: {saved}")
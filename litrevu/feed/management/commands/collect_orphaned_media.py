@@ -0,0 +1,75 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from feed.orphans import iter_media_files
+from feed.orphans import is_still_orphaned
+from feed.orphans import iter_orphans
+from feed.orphans import remove_orphan
+from feed.timeline import BATCH_SIZE
+
+
+class Command(BaseCommand):
+    """
+    Delete (or quarantine) the media files that no ticket references anymore.
+
+    The media directory is walked with `os.scandir` and the files are checked against
+    `Ticket.image` in batches, so that millions of files can be processed in constant memory.
+    Variants are kept as long as their original image is referenced. Recent files are spared,
+    as they may belong to a ticket being created, and every orphan is checked again right
+    before it is removed, in case an identical upload claimed it since its batch was checked.
+    """
+    help = "Remove the orphaned ticket images and variants from the media directory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--directory', default='tickets', help="Directory of the media root to clean.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help="Number of files checked per query.")
+        parser.add_argument('--min-age', type=int, default=24 * 60 * 60,
+                            help="Spare the files modified less than this number of seconds ago.")
+        parser.add_argument('--quarantine', help="Move the orphans to this directory instead of deleting them.")
+        parser.add_argument('--max-rate', type=float, default=0,
+                            help="Maximum number of files removed per second (0 for no limit).")
+        parser.add_argument('--dry-run', action='store_true', help="List the orphans without removing them.")
+
+    def handle(self, *args, **options):
+        root = settings.MEDIA_ROOT
+        quarantine = os.path.abspath(options['quarantine']) if options['quarantine'] else None
+        interval = 1 / options['max_rate'] if options['max_rate'] > 0 else 0
+
+        scanned = 0
+
+        def count(files):
+            nonlocal scanned
+            for file in files:
+                scanned += 1
+                yield file
+
+        files = count(iter_media_files(root, options['directory'], exclude=[quarantine] if quarantine else []))
+        removed, reclaimed, failed, claimed = 0, 0, 0, 0
+        for orphan in iter_orphans(files, options['batch_size'], options['min_age']):
+            if options['dry_run']:
+                self.stdout.write(orphan.name)
+            else:
+                started = time.monotonic()
+                if not is_still_orphaned(root, orphan):
+                    claimed += 1
+                    continue
+                try:
+                    remove_orphan(root, orphan, quarantine)
+                except OSError as error:
+                    self.stderr.write(f"Could not remove {orphan.name}: {error}")
+                    failed += 1
+                    continue
+                # Spread the removals over time, to spare the disk of the running site
+                if interval:
+                    time.sleep(max(interval - (time.monotonic() - started), 0))
+            removed += 1
+            reclaimed += orphan.size
+
+        action = "Would remove" if options['dry_run'] else "Quarantined" if quarantine else "Removed"
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {scanned} file(s). {action} {removed} orphan(s), {reclaimed} bytes"
+            f" ({reclaimed / 1024 / 1024:.1f} MiB), {claimed} claimed since the scan, {failed} failure(s)."
+        ))
@@ -0,0 +1,64 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from feed.images import generate_variants
+from feed.models import Ticket
+from PIL import Image
+
+
+def generate(name, overwrite):
+    """
+    Generate the variants of one image in a worker process.
+
+    Returns:
+    tuple (str, str or None)
+        The image name and the error message, if any.
+    """
+    try:
+        generate_variants(name, overwrite=overwrite)
+    except (OSError, Image.DecompressionBombError) as error:
+        return name, str(error)
+    return name, None
+
+
+class Command(BaseCommand):
+    """
+    Generate the resized (and WebP) variants of every existing ticket image.
+
+    Image names are read from the database in batches and each batch is spread over a
+    pool of worker processes, since resizing is CPU bound.
+    """
+    help = "Backfill the resized variants of ticket images using a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Number of worker processes (defaults to the number of CPUs).")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Number of images read from the database and dispatched at once.")
+        parser.add_argument('--force', action='store_true',
+                            help="Regenerate the variants that already exist.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        names = Ticket.objects.exclude(image='').exclude(image__isnull=True).order_by('image')
+        names = names.values_list('image', flat=True).distinct()
+
+        # Worker processes must not inherit the open database connections
+        connections.close_all()
+
+        processed, failed, last_name = 0, 0, ''
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as executor:
+            while True:
+                batch = list(names.filter(image__gt=last_name)[:batch_size])
+                if not batch:
+                    break
+                for name, error in executor.map(generate, batch, [options['force']] * len(batch)):
+                    processed += 1
+                    if error:
+                        failed += 1
+                        self.stderr.write(f"{name}: {error}")
+                last_name = batch[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} image(s), {failed} failure(s)."))
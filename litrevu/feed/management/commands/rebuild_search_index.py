@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from feed.search import is_search_available
+from feed.search import rebuild_search_index
+from feed.timeline import BATCH_SIZE
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the full-text search index of tickets and reviews.
+
+    The index is kept up to date by database triggers; this command repopulates it from
+    scratch, e.g. after importing data with the triggers disabled. Posts are streamed from
+    the database and inserted in chunks.
+    """
+    help = "Rebuild the full-text search index of tickets and reviews in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=BATCH_SIZE,
+                            help="Number of posts read and inserted at a time.")
+
+    def handle(self, *args, **options):
+        if not is_search_available():
+            raise CommandError("Full-text search requires SQLite with FTS5.")
+        total = rebuild_search_index(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} post(s)."))
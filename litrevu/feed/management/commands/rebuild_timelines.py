@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from feed.models import PulledAuthor
+from feed.timeline import BATCH_SIZE
+from feed.timeline import rebuild_timeline
+from feed.timeline import refresh_pulled_authors
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the materialized feed timelines from tickets, reviews and the follow graph.
+
+    On a full rebuild the set of pulled authors is recomputed first; a rebuild of some users
+    keeps it as is. The timelines are then rebuilt, reading and inserting rows in batches.
+    """
+    help = "Rebuild the materialized feed timelines in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help="Only rebuild the timelines of these users.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help="Number of rows read and inserted per query.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        if options['usernames']:
+            # Keep the current pulled authors: changing them would require rebuilding the timelines
+            # of all their followers, not only the ones of the given users
+            pulled_ids = set(PulledAuthor.objects.values_list('user_id', flat=True))
+        else:
+            # Recompute which authors are read on pull instead of being fanned out
+            pulled_ids = refresh_pulled_authors()
+        self.stdout.write(f"{len(pulled_ids)} author(s) served by pull-on-read.")
+
+        users = CustomUser.objects.order_by('id')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        # Rebuild the timelines one owner at a time, reading the users in batches of IDs
+        rebuilt, last_id = 0, 0
+        while True:
+            user_ids = list(users.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+            if not user_ids:
+                break
+            for user_id in user_ids:
+                rebuild_timeline(user_id, pulled_ids, batch_size)
+            rebuilt += len(user_ids)
+            last_id = user_ids[-1]
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} timeline(s)."))
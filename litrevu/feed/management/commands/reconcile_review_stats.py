@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from feed.review_stats import reconcile_review_stats
+from feed.timeline import BATCH_SIZE
+
+
+class Command(BaseCommand):
+    """
+    Recompute the review count and rating sum stored on every ticket.
+
+    The views keep the aggregates up to date, but reviews removed by other means (a cascade
+    when a user is deleted, the admin, the shell...) are not counted out. This command fixes
+    the tickets whose aggregates drifted, reading them in batches.
+    """
+    help = "Recompute the review aggregates stored on tickets in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help="Number of tickets checked per query.")
+
+    def handle(self, *args, **options):
+        fixed = reconcile_review_stats(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Fixed the review aggregates of {fixed} ticket(s)."))
@@ -0,0 +1,178 @@
+import random
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import transaction
+from feed.models import Review
+from feed.models import Ticket
+from feed.review_stats import reconcile_review_stats
+from feed.storage import ticket_image_storage
+from feed.timeline import rebuild_timeline
+from feed.timeline import refresh_pulled_authors
+from PIL import Image
+from users.models import CustomUser
+from users.models import UserFollows
+from users.models import normalize_username
+
+COVER_COLORS = ['#8e44ad', '#2c3e50', '#c0392b', '#16a085', '#d35400', '#7f8c8d']
+
+
+def power_law_counts(total, mean, alpha, rng, maximum=None):
+    """
+    Draw one count per user from a Pareto distribution, scaled so that the counts average `mean`.
+
+    A few users get very large counts and most get small ones, like posting activity and
+    popularity on real social networks.
+    """
+    weights = [rng.paretovariate(alpha) for _ in range(total)]
+    scale = mean * total / sum(weights) if weights else 0
+    counts = [int(round(weight * scale)) for weight in weights]
+    if maximum is not None:
+        counts = [min(count, maximum) for count in counts]
+    return counts
+
+
+def iter_batches(items, batch_size):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+class Command(BaseCommand):
+    """
+    Populate the database with synthetic users, follows, tickets and reviews.
+
+    Follows form a power-law graph: the number of users each user follows and the
+    popularity of each user are both drawn from a Pareto distribution, so a handful of
+    users gather most of the followers. Posting activity follows the same kind of law.
+    Everything is inserted with `bulk_create` in batches, then the timelines of the new
+    users are built.
+    """
+    help = "Create synthetic users with a power-law follow graph, tickets and reviews."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help="Number of users to create.")
+        parser.add_argument('--follows', type=float, default=20, help="Mean number of users each user follows.")
+        parser.add_argument('--tickets', type=float, default=10, help="Mean number of tickets per user.")
+        parser.add_argument('--reviews', type=float, default=10, help="Mean number of reviews per user.")
+        parser.add_argument('--images', type=float, default=0.0,
+                            help="Share of the tickets with an image, between 0 and 1.")
+        parser.add_argument('--alpha', type=float, default=1.5, help="Exponent of the power laws.")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the random generator.")
+        parser.add_argument('--prefix', default='seed', help="Prefix of the generated usernames.")
+        parser.add_argument('--password', default='litrevu-seed', help="Password of every generated user.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Number of rows inserted per query.")
+        parser.add_argument('--no-timelines', action='store_true', help="Do not build the feed timelines.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        prefix = options['prefix']
+
+        if CustomUser.objects.filter(username__startswith=f"{prefix}_").exists():
+            raise CommandError(f"Users prefixed with '{prefix}_' already exist, pick another --prefix.")
+
+        with transaction.atomic():
+            user_ids = self.create_users(options['users'], prefix, options['password'], batch_size)
+            follows = self.create_follows(user_ids, options['follows'], options['alpha'], rng, batch_size)
+            ticket_ids = self.create_tickets(user_ids, options['tickets'], options['images'], options['alpha'],
+                                             rng, batch_size)
+            reviews = self.create_reviews(user_ids, ticket_ids, options['reviews'], options['alpha'], rng,
+                                          batch_size)
+            # bulk_create bypasses the views maintaining the review aggregates of the tickets
+            reconcile_review_stats(batch_size)
+
+        self.stdout.write(f"Created {len(user_ids)} users, {follows} follows, "
+                          f"{len(ticket_ids)} tickets and {reviews} reviews.")
+
+        if not options['no_timelines']:
+            pulled_ids = refresh_pulled_authors()
+            for user_id in user_ids:
+                rebuild_timeline(user_id, pulled_ids, batch_size)
+            self.stdout.write(f"Built {len(user_ids)} timelines ({len(pulled_ids)} pulled authors).")
+
+    def create_users(self, total, prefix, password, batch_size):
+        # Hash the password once: hashing it for every user would dominate the run time
+        password_hash = make_password(password)
+        # bulk_create bypasses `CustomUser.save`, so the normalized username is set here
+        users = [CustomUser(username=f"{prefix}_{index}", username_normalized=normalize_username(f"{prefix}_{index}"),
+                            password=password_hash)
+                 for index in range(total)]
+        user_ids = []
+        for batch in iter_batches(users, batch_size):
+            user_ids.extend(user.pk for user in CustomUser.objects.bulk_create(batch))
+        return user_ids
+
+    def create_follows(self, user_ids, mean, alpha, rng, batch_size):
+        if len(user_ids) < 2:
+            return 0
+
+        # Popular users are picked as followees proportionally to a power-law weight
+        popularity = [rng.paretovariate(alpha) for _ in user_ids]
+        cum_weights = []
+        total = 0.0
+        for weight in popularity:
+            total += weight
+            cum_weights.append(total)
+
+        counts = power_law_counts(len(user_ids), mean, alpha, rng, maximum=len(user_ids) - 1)
+        follows = []
+        for user_id, count in zip(user_ids, counts):
+            followed = set()
+            attempts = 0
+            while len(followed) < count and attempts < count * 10:
+                candidate = rng.choices(user_ids, cum_weights=cum_weights)[0]
+                if candidate != user_id:
+                    followed.add(candidate)
+                attempts += 1
+            follows.extend(UserFollows(user_id=user_id, followed_user_id=followed_id) for followed_id in followed)
+
+        for batch in iter_batches(follows, batch_size):
+            UserFollows.objects.bulk_create(batch, ignore_conflicts=True)
+        return len(follows)
+
+    def create_covers(self):
+        """
+        Store a few generated book covers, shared by the tickets that get an image.
+        """
+        names = []
+        for index, color in enumerate(COVER_COLORS):
+            buffer = BytesIO()
+            Image.new('RGB', (600, 900), color).save(buffer, 'JPEG', quality=80)
+            names.append(ticket_image_storage.save(f"tickets/seed_cover_{index}.jpg", ContentFile(buffer.getvalue())))
+        return names
+
+    def create_tickets(self, user_ids, mean, image_share, alpha, rng, batch_size):
+        covers = self.create_covers() if image_share > 0 else []
+        tickets = []
+        for user_id, count in zip(user_ids, power_law_counts(len(user_ids), mean, alpha, rng)):
+            for index in range(count):
+                image = rng.choice(covers) if covers and rng.random() < image_share else None
+                tickets.append(Ticket(user_id=user_id,
+                                      title=f"Book {user_id}-{index}",
+                                      description=f"Looking for a review of book {user_id}-{index}.",
+                                      image=image))
+
+        ticket_ids = []
+        for batch in iter_batches(tickets, batch_size):
+            ticket_ids.extend(ticket.pk for ticket in Ticket.objects.bulk_create(batch))
+        return ticket_ids
+
+    def create_reviews(self, user_ids, ticket_ids, mean, alpha, rng, batch_size):
+        if not ticket_ids:
+            return 0
+
+        reviews = []
+        for user_id, count in zip(user_ids, power_law_counts(len(user_ids), mean, alpha, rng)):
+            for index in range(count):
+                reviews.append(Review(user_id=user_id,
+                                      ticket_id=rng.choice(ticket_ids),
+                                      rating=rng.randint(0, 5),
+                                      headline=f"Review {user_id}-{index}",
+                                      body="A synthetic review."))
+
+        for batch in iter_batches(reviews, batch_size):
+            Review.objects.bulk_create(batch)
+        return len(reviews)
@@ -0,0 +1,37 @@
+import sqlite3
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.db import connections
+from feed.replicas import REPLICA_DB_ALIAS
+from feed.replicas import has_replica
+
+
+class Command(BaseCommand):
+    """
+    Copy the primary SQLite database into the replica one.
+
+    SQLite has no replication: when both databases are local files, e.g. to try the replica
+    routing in development, this command stands in for it. The copy is made with the online
+    backup API, so the primary can keep serving requests meanwhile.
+    """
+    help = "Copy the primary SQLite database to the replica database file."
+
+    def handle(self, *args, **options):
+        if not has_replica():
+            raise CommandError("No replica database is configured, set DATABASE_REPLICA_NAME.")
+        primary, replica = connections[DEFAULT_DB_ALIAS], connections[REPLICA_DB_ALIAS]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError("Only SQLite databases can be copied; use the replication of your database server.")
+
+        # Close the replica connection of this process, the file is overwritten
+        replica.close()
+        primary.ensure_connection()
+        target = sqlite3.connect(replica.settings_dict['NAME'])
+        try:
+            primary.connection.backup(target)
+        finally:
+            target.close()
+        self.stdout.write(self.style.SUCCESS(f"Copied {primary.settings_dict['NAME']} "
+                                             f"to {replica.settings_dict['NAME']}."))
@@ -0,0 +1,94 @@
+import re
+from urllib.parse import quote
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Size of the blocks read from a file when sending a part of it
+CHUNK_SIZE = 64 * 1024
+
+
+class UnsatisfiableRange(Exception):
+    """
+    Raised when the requested range lies outside of the file.
+    """
+
+
+def parse_range(header, size):
+    """
+    Parse a `Range` header into the first and last byte positions to send.
+
+    Only single byte ranges are supported, as sent by browsers and media players to resume a
+    download or seek; other ranges, and invalid ones such as `bytes=9-3`, are ignored and the
+    whole file is sent, as allowed by RFC 9110.
+
+    Parameters:
+    header: str or None
+        The `Range` header of the request.
+    size: int
+        The size of the file, in bytes.
+
+    Returns:
+    tuple (int, int) or None
+        The inclusive positions of the range, or None to send the whole file.
+
+    Raises:
+    UnsatisfiableRange
+        When the range starts past the end of the file.
+    """
+    match = RANGE.match(header.replace(' ', '')) if header else None
+    if match is None or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        # Suffix range: the last `end` bytes
+        length = int(end)
+        if length == 0:
+            raise UnsatisfiableRange()
+        return max(size - length, 0), size - 1
+    start = int(start)
+    if end and int(end) < start:
+        return None
+    if start >= size:
+        raise UnsatisfiableRange()
+    end = min(int(end), size - 1) if end else size - 1
+    return start, end
+
+
+def iter_file_range(file, start, end, chunk_size=CHUNK_SIZE):
+    """
+    Yield the bytes of a file from `start` to `end` (inclusive), a chunk at a time, then close it.
+    """
+    try:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def get_sendfile_headers(header, name, path, prefix):
+    """
+    Build the header asking the front web server to send a file itself.
+
+    Parameters:
+    header: str
+        `X-Accel-Redirect` (nginx), which takes a URL of an internal location, or `X-Sendfile`
+        (Apache, lighttpd), which takes the path of the file.
+    name: str
+        The name of the file, relative to `MEDIA_ROOT`.
+    path: str
+        The absolute path of the file.
+    prefix: str
+        The internal location of the media directory, for `X-Accel-Redirect`.
+
+    Returns:
+    dict
+    """
+    if header.lower() == 'x-accel-redirect':
+        return {'X-Accel-Redirect': prefix.rstrip('/') + '/' + quote(name)}
+    return {header: path}
@@ -0,0 +1,145 @@
+# Generated by Django 4.2.5 on 2026-10-18 18:20
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def fill_timelines(apps, schema_editor):
+    """
+    Materialize the feeds of the existing users, like the `rebuild_timelines` command.
+
+    The posts of every author are written to their own timeline and to the ones of their
+    followers, unless they have more than `FEED_FANOUT_MAX_FOLLOWERS` followers, in which
+    case they are recorded as pulled authors and read on pull.
+    """
+    alias = schema_editor.connection.alias
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    UserFollows = apps.get_model("users", "UserFollows")
+    Ticket = apps.get_model("feed", "Ticket")
+    Review = apps.get_model("feed", "Review")
+    TimelineEntry = apps.get_model("feed", "TimelineEntry")
+    PulledAuthor = apps.get_model("feed", "PulledAuthor")
+
+    pulled_ids = set(
+        UserFollows.objects.using(alias).values("followed_user_id")
+        .annotate(follower_count=Count("id"))
+        .filter(follower_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS)
+        .values_list("followed_user_id", flat=True)
+    )
+    PulledAuthor.objects.using(alias).bulk_create([PulledAuthor(user_id=user_id) for user_id in pulled_ids])
+
+    batch = []
+    for author_id in User.objects.using(alias).order_by("id").values_list("id", flat=True).iterator():
+        owner_ids = [author_id]
+        if author_id not in pulled_ids:
+            owner_ids += list(UserFollows.objects.using(alias).filter(followed_user_id=author_id)
+                              .values_list("user_id", flat=True))
+        for content_type, model in (("TICKET", Ticket), ("REVIEW", Review)):
+            posts = model.objects.using(alias).filter(user_id=author_id).values_list("id", "time_create")
+            for post_id, time_create in posts.iterator():
+                batch.extend(TimelineEntry(owner_id=owner_id, author_id=author_id, content_type=content_type,
+                                           post_id=post_id, time_create=time_create)
+                             for owner_id in owner_ids)
+                if len(batch) >= BATCH_SIZE:
+                    TimelineEntry.objects.using(alias).bulk_create(batch, ignore_conflicts=True)
+                    batch = []
+    if batch:
+        TimelineEntry.objects.using(alias).bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("users", "0002_userfollows"),
+        ("feed", "0005_alter_ticket_image"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PulledAuthor",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="TimelineEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "content_type",
+                    models.CharField(
+                        choices=[("TICKET", "Ticket"), ("REVIEW", "Review")],
+                        max_length=6,
+                    ),
+                ),
+                ("post_id", models.PositiveBigIntegerField()),
+                ("time_create", models.DateTimeField()),
+                (
+                    "author",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="timeline",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["owner", "-time_create", "-post_id"],
+                        name="timeline_owner_time_idx",
+                    ),
+                    models.Index(
+                        fields=["owner", "author"], name="timeline_owner_author_idx"
+                    ),
+                    models.Index(
+                        fields=["content_type", "post_id"], name="timeline_post_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="timelineentry",
+            constraint=models.UniqueConstraint(
+                fields=("owner", "content_type", "post_id"), name="unique_timeline_post"
+            ),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
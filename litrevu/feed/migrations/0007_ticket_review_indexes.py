@@ -0,0 +1,31 @@
+# Generated by Django 4.2.5 on 2026-10-18 18:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0006_timelineentry_pulledauthor"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["user", "-time_create"], name="review_user_time_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["user", "ticket"], name="review_user_ticket_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ticket",
+            index=models.Index(
+                fields=["user", "-time_create"], name="ticket_user_time_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,86 @@
+from django.db import migrations
+
+# Posts are indexed under rowid 2 * id for tickets and 2 * id + 1 for reviews, see feed.search.
+# The update triggers only fire when the indexed text changes, not on other column updates.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE feed_post_search USING fts5(
+        title, body, content_type UNINDEXED, post_id UNINDEXED, user_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER feed_ticket_search_insert AFTER INSERT ON feed_ticket BEGIN
+        INSERT INTO feed_post_search (rowid, title, body, content_type, post_id, user_id)
+        VALUES (new.id * 2, new.title, new.description, 'TICKET', new.id, new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER feed_ticket_search_update AFTER UPDATE OF title, description ON feed_ticket BEGIN
+        UPDATE feed_post_search SET title = new.title, body = new.description WHERE rowid = new.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER feed_ticket_search_delete AFTER DELETE ON feed_ticket BEGIN
+        DELETE FROM feed_post_search WHERE rowid = old.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER feed_review_search_insert AFTER INSERT ON feed_review BEGIN
+        INSERT INTO feed_post_search (rowid, title, body, content_type, post_id, user_id)
+        VALUES (new.id * 2 + 1, new.headline, new.body, 'REVIEW', new.id, new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER feed_review_search_update AFTER UPDATE OF headline, body ON feed_review BEGIN
+        UPDATE feed_post_search SET title = new.headline, body = new.body WHERE rowid = new.id * 2 + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER feed_review_search_delete AFTER DELETE ON feed_review BEGIN
+        DELETE FROM feed_post_search WHERE rowid = old.id * 2 + 1;
+    END
+    """,
+    """
+    INSERT INTO feed_post_search (rowid, title, body, content_type, post_id, user_id)
+    SELECT id * 2, title, description, 'TICKET', id, user_id FROM feed_ticket
+    """,
+    """
+    INSERT INTO feed_post_search (rowid, title, body, content_type, post_id, user_id)
+    SELECT id * 2 + 1, headline, body, 'REVIEW', id, user_id FROM feed_review
+    """,
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS feed_ticket_search_insert",
+    "DROP TRIGGER IF EXISTS feed_ticket_search_update",
+    "DROP TRIGGER IF EXISTS feed_ticket_search_delete",
+    "DROP TRIGGER IF EXISTS feed_review_search_insert",
+    "DROP TRIGGER IF EXISTS feed_review_search_update",
+    "DROP TRIGGER IF EXISTS feed_review_search_delete",
+    "DROP TABLE IF EXISTS feed_post_search",
+]
+
+
+def run_on_sqlite(statements):
+    """
+    Build a migration function executing SQL statements on SQLite only: FTS5 is SQLite-specific.
+    """
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0007_ticket_review_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(CREATE_SQL), run_on_sqlite(DROP_SQL)),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.5 on 2026-10-18 18:43
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_review_stats(apps, schema_editor):
+    Ticket = apps.get_model("feed", "Ticket")
+    Review = apps.get_model("feed", "Review")
+    reviews = Review.objects.filter(ticket=OuterRef("pk")).order_by().values("ticket")
+    Ticket.objects.using(schema_editor.connection.alias).update(
+        review_count=Coalesce(Subquery(reviews.annotate(count=Count("id")).values("count"),
+                                       output_field=IntegerField()), 0),
+        rating_sum=Coalesce(Subquery(reviews.annotate(total=Sum("rating")).values("total"),
+                                     output_field=IntegerField()), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0008_post_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ticket",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="ticket",
+            name="review_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_review_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.5 on 2026-10-18 19:01
+
+from django.db import migrations, models
+import feed.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0009_ticket_review_stats"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="ticket",
+            name="image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=feed.storage.get_ticket_image_storage,
+                upload_to="tickets/",
+            ),
+        ),
+    ]
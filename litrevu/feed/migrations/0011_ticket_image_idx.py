@@ -0,0 +1,17 @@
+# Generated by Django 4.2.5 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0010_ticket_image_storage"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="ticket",
+            index=models.Index(fields=["image"], name="ticket_image_idx"),
+        ),
+    ]
@@ -2,18 +2,50 @@ from django.db import models
 from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.core.validators import MaxValueValidator
+from feed.storage import get_ticket_image_storage
+
+TICKET = 'TICKET'
+REVIEW = 'REVIEW'
 
 
 class Ticket(models.Model):
     title = models.fields.CharField(max_length=128)
     description = models.fields.TextField(max_length=2048, blank=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    image = models.ImageField(null=True, blank=True, upload_to='tickets/')
+    # Stored under the hash of their content, so that identical images share one file
+    image = models.ImageField(null=True, blank=True, upload_to='tickets/', storage=get_ticket_image_storage)
     time_create = models.DateTimeField(auto_now_add=True)
+    # Aggregates of the reviews of the ticket, maintained by `feed.review_stats`
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+
+    # Columns only ever written with F() expressions, left out when a loaded ticket is saved
+    COUNTER_FIELDS = ('review_count', 'rating_sum')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-time_create'], name='ticket_user_time_idx'),
+            # Counting the tickets sharing an image, see `feed.images.release_image` and `feed.orphans`
+            models.Index(fields=['image'], name='ticket_image_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @property
+    def average_rating(self):
+        """
+        The average rating of the reviews of the ticket, or None when it has no review.
+        """
+        return self.rating_sum / self.review_count if self.review_count else None
+
+    def save(self, *args, **kwargs):
+        # Do not overwrite the counters with the values loaded with the ticket, which may be outdated
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.COUNTER_FIELDS]
+        super().save(*args, **kwargs)
+
 
 class Review(models.Model):
     ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE)
@@ -23,5 +55,53 @@ class Review(models.Model):
     body = models.TextField(max_length=8192, blank=True)
     time_create = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-time_create'], name='review_user_time_idx'),
+            models.Index(fields=['user', 'ticket'], name='review_user_ticket_idx'),
+        ]
+
     def __str__(self):
         return self.headline
+
+
+class TimelineEntry(models.Model):
+    """
+    A post materialized in the feed of one user.
+
+    Entries are written when a post is created (fan-out on write) and when the follow graph
+    changes, so that reading a feed is a single range scan on `(owner, time_create, post_id)`.
+    """
+    CONTENT_TYPE_CHOICES = [(TICKET, 'Ticket'), (REVIEW, 'Review')]
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='timeline')
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    content_type = models.CharField(max_length=6, choices=CONTENT_TYPE_CHOICES)
+    post_id = models.PositiveBigIntegerField()
+    time_create = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'content_type', 'post_id'], name='unique_timeline_post'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', '-time_create', '-post_id'], name='timeline_owner_time_idx'),
+            models.Index(fields=['owner', 'author'], name='timeline_owner_author_idx'),
+            models.Index(fields=['content_type', 'post_id'], name='timeline_post_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.content_type} {self.post_id} in the feed of {self.owner_id}"
+
+
+class PulledAuthor(models.Model):
+    """
+    An author whose posts are not fanned out because of their number of followers.
+
+    Their posts are pulled from `Ticket` and `Review` when a follower reads the feed instead.
+    The flag is sticky until timelines are rebuilt, so that writers and readers always agree.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+
+    def __str__(self):
+        return f"Posts of {self.user_id} are pulled on read"
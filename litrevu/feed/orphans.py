@@ -0,0 +1,160 @@
+import os
+import posixpath
+import re
+import shutil
+import time
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+from feed.images import VARIANTS_DIR
+from feed.models import Ticket
+
+# Variants are named `<directory>/variants/<stem>_<width>w.<extension>` after their original
+VARIANT_NAME = re.compile(r'^(?P<stem>.+)_\d+w\.[^.]+$')
+
+
+class MediaFile:
+    """
+    A file found in the media directory, with its storage name, size and modification time.
+    """
+    def __init__(self, name, size, mtime):
+        self.name = name
+        self.size = size
+        self.mtime = mtime
+
+
+def iter_media_files(root, directory, exclude=()):
+    """
+    Walk a directory of the media root depth-first with `os.scandir`, yielding its files.
+
+    Only the paths of the directories left to visit are kept in memory, never the whole listing.
+
+    Parameters:
+    root: str
+        The media root.
+    directory: str
+        The directory to walk, relative to the root, e.g. `tickets`.
+    exclude: iterable of str
+        Absolute paths of directories to skip, such as a quarantine directory inside the root.
+
+    Yields:
+    MediaFile
+    """
+    excluded = {os.path.realpath(path) for path in exclude}
+    pending = [os.path.join(root, directory)]
+    while pending:
+        path = pending.pop()
+        if os.path.realpath(path) in excluded:
+            continue
+        try:
+            entries = os.scandir(path)
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    name = os.path.relpath(entry.path, root).replace(os.sep, '/')
+                    yield MediaFile(name, stat.st_size, stat.st_mtime)
+
+
+def get_variant_prefix(name):
+    """
+    Return the name of the original of a variant, without its extension, or None for an original.
+
+    `tickets/ab/variants/<hash>_300w.webp` gives `tickets/ab/<hash>`.
+    """
+    directory, filename = posixpath.split(name)
+    if posixpath.basename(directory) != VARIANTS_DIR:
+        return None
+    match = VARIANT_NAME.match(filename)
+    if match is None:
+        return None
+    return posixpath.join(posixpath.dirname(directory), match.group('stem'))
+
+
+def find_referenced(files):
+    """
+    Tell which files of a batch are referenced by a ticket, directly or as a variant of its image.
+
+    Originals are looked up with one `image IN (...)` query. Variants are matched on the name of
+    their original without its extension, i.e. with a `prefix. <= image < prefix/` range per
+    original, OR-ed in a second query. Both use the index on `Ticket.image`.
+
+    Returns:
+    set of str
+        The names of the referenced files.
+    """
+    originals = [file.name for file in files if get_variant_prefix(file.name) is None]
+    prefixes = {get_variant_prefix(file.name) for file in files} - {None}
+
+    referenced = set()
+    if originals:
+        referenced.update(Ticket.objects.filter(image__in=originals).values_list('image', flat=True).distinct())
+    if prefixes:
+        # '/' follows '.' in ASCII, so the range selects the names made of the prefix and an extension
+        ranges = reduce(or_, (Q(image__gte=prefix + '.', image__lt=prefix + '/') for prefix in prefixes))
+        for image in Ticket.objects.filter(ranges).values_list('image', flat=True).distinct():
+            referenced.add(posixpath.splitext(image)[0])
+    return {file.name for file in files if file.name in referenced or get_variant_prefix(file.name) in referenced}
+
+
+def iter_orphans(files, batch_size=1000, min_age=0):
+    """
+    Yield the files no ticket references, checking them against the database in batches.
+
+    Files modified less than `min_age` seconds ago are skipped: they may belong to a ticket
+    being created, or to an upload of an identical image, see `feed.storage`.
+    """
+    deadline = time.time() - min_age
+    batch = []
+    for file in files:
+        if file.mtime > deadline:
+            continue
+        batch.append(file)
+        if len(batch) >= batch_size:
+            yield from check_batch(batch)
+            batch = []
+    if batch:
+        yield from check_batch(batch)
+
+
+def check_batch(batch):
+    """
+    Yield the files of a batch that no ticket references.
+    """
+    referenced = find_referenced(batch)
+    for file in batch:
+        if file.name not in referenced:
+            yield file
+
+
+def is_still_orphaned(root, file):
+    """
+    Check again, right before its removal, that a file found orphaned has not been claimed since.
+
+    Removals may happen long after the batch of a file was checked, e.g. with a rate limit. In
+    the meantime an identical upload may have refreshed its modification time, see
+    `feed.storage`, and a ticket may have started to reference it or its original.
+    """
+    try:
+        mtime = os.stat(os.path.join(root, file.name)).st_mtime
+    except FileNotFoundError:
+        return False
+    return mtime == file.mtime and not find_referenced([file])
+
+
+def remove_orphan(root, file, quarantine=None):
+    """
+    Delete an orphaned file, or move it under the quarantine directory, keeping its relative path.
+    """
+    path = os.path.join(root, file.name)
+    if quarantine is None:
+        os.remove(path)
+        return
+    destination = os.path.join(quarantine, file.name)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    shutil.move(path, destination)
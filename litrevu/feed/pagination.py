@@ -0,0 +1,272 @@
+import asyncio
+from base64 import urlsafe_b64decode
+from base64 import urlsafe_b64encode
+from binascii import Error as BinasciiError
+from datetime import datetime
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db import router
+from django.db.models import CharField
+from django.db.models import Exists
+from django.db.models import Max
+from django.db.models import OuterRef
+from django.db.models import Q
+from django.db.models import Value
+from django.utils.functional import cached_property
+from feed.models import REVIEW
+from feed.models import TICKET
+from feed.models import Ticket
+from feed.models import Review
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised when a pagination cursor cannot be decoded.
+    """
+
+
+class FeedPage:
+    """
+    One page of the merged ticket/review stream.
+
+    Attributes:
+    posts: list
+        Ticket and Review instances, newest first, each annotated with `content_type`.
+    next_cursor: str or None
+        Opaque cursor pointing after the last post of the page, or None on the last page.
+    """
+    def __init__(self, posts, next_cursor):
+        self.posts = posts
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(time_create, pk):
+    """
+    Encode the `(time_create, id)` keyset position of a post into an opaque URL-safe string.
+    """
+    raw = f"{time_create.isoformat()}|{pk}"
+    return urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by `encode_cursor`.
+
+    Returns:
+    tuple (datetime, int)
+        The `(time_create, id)` keyset position.
+
+    Raises:
+    InvalidCursor
+        If the cursor is malformed.
+    """
+    try:
+        raw = urlsafe_b64decode(cursor.encode()).decode()
+        time_create, pk = raw.split('|')
+        return datetime.fromisoformat(time_create), int(pk)
+    except (BinasciiError, UnicodeError, ValueError) as error:
+        raise InvalidCursor(cursor) from error
+
+
+def filter_before(queryset, position, pk_field='pk'):
+    """
+    Restrict a queryset to rows strictly older than a keyset position.
+
+    Parameters:
+    queryset: QuerySet
+        A queryset exposing a `time_create` column.
+    position: tuple (datetime, int)
+        The `(time_create, id)` position returned by `decode_cursor`.
+    pk_field: str
+        The column holding the id part of the key.
+    """
+    time_create, pk = position
+    return queryset.filter(
+        Q(time_create__lt=time_create) | Q(time_create=time_create, **{f"{pk_field}__lt": pk})
+    )
+
+
+def merged_posts_query(user_ids, position=None):
+    """
+    Build a single UNION ALL query over tickets and reviews posted by `user_ids`.
+
+    The query yields `(content_type, id, time_create)` rows ordered newest first, so that
+    slicing it lets the database return only the rows of the requested page.
+
+    Parameters:
+    user_ids: iterable of Integers
+        The authors whose posts make up the stream.
+    position: tuple (datetime, int), optional
+        Only rows strictly older than this keyset position are returned.
+    """
+    tickets = Ticket.objects.filter(user_id__in=user_ids)
+    reviews = Review.objects.filter(user_id__in=user_ids)
+    if position is not None:
+        tickets = filter_before(tickets, position)
+        reviews = filter_before(reviews, position)
+
+    tickets = tickets.annotate(content_type=Value(TICKET, CharField())).values_list('content_type',
+                                                                                    'id',
+                                                                                    'time_create')
+    reviews = reviews.annotate(content_type=Value(REVIEW, CharField())).values_list('content_type',
+                                                                                    'id',
+                                                                                    'time_create')
+    return tickets.union(reviews, all=True).order_by('-time_create', '-id')
+
+
+def get_post_querysets(viewer_id=None):
+    """
+    Build the querysets post instances are loaded from.
+
+    They join the author (and, for reviews, the reviewed ticket) the snippets display.
+
+    Parameters:
+    viewer_id: int, optional
+        When given, tickets are annotated with `is_reviewed`, telling whether this user
+        already reviewed them.
+
+    Returns:
+    dict
+        The Ticket and Review querysets, keyed by content type.
+    """
+    tickets = Ticket.objects.select_related('user')
+    if viewer_id is not None:
+        tickets = tickets.annotate(
+            is_reviewed=Exists(Review.objects.filter(ticket=OuterRef('pk'), user_id=viewer_id))
+        )
+    return {TICKET: tickets, REVIEW: Review.objects.select_related('user', 'ticket')}
+
+
+def group_row_ids(rows):
+    """
+    Group the ids of `(content_type, id, time_create)` rows by content type.
+    """
+    ids = {TICKET: [], REVIEW: []}
+    for content_type, pk, _ in rows:
+        ids[content_type].append(pk)
+    return ids
+
+
+def assemble_posts(rows, instances):
+    """
+    Put loaded instances back in the order of their rows, annotating them with `content_type`.
+
+    Rows whose post disappeared in the meantime are skipped.
+    """
+    posts = []
+    for content_type, pk, _ in rows:
+        post = instances[content_type].get(pk)
+        if post is None:
+            continue
+        post.content_type = content_type
+        posts.append(post)
+    return posts
+
+
+def load_posts(rows, viewer_id=None):
+    """
+    Turn `(content_type, id, time_create)` rows into model instances, preserving their order.
+
+    One query is issued per content type, see `get_post_querysets`.
+
+    Parameters:
+    rows: list of tuples
+        Rows as returned by `merged_posts_query`.
+    viewer_id: int, optional
+        The user reading the posts, see `get_post_querysets`.
+    """
+    querysets = get_post_querysets(viewer_id)
+    instances = {content_type: querysets[content_type].in_bulk(ids) if ids else {}
+                 for content_type, ids in group_row_ids(rows).items()}
+    return assemble_posts(rows, instances)
+
+
+async def aload_posts(rows, viewer_id=None):
+    """
+    Asynchronous version of `load_posts`, fetching tickets and reviews concurrently.
+    """
+    async def fetch(content_type, ids):
+        return content_type, await querysets[content_type].ain_bulk(ids) if ids else {}
+
+    querysets = get_post_querysets(viewer_id)
+    results = await asyncio.gather(*(fetch(content_type, ids) for content_type, ids in group_row_ids(rows).items()))
+    return assemble_posts(rows, dict(results))
+
+
+def paginate_rows(rows, page_size):
+    """
+    Split `page_size + 1` fetched rows into the rows of the page and the cursor of the next page.
+    """
+    rows = list(rows)
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    _, pk, time_create = rows[-1]
+    return rows, encode_cursor(time_create, pk)
+
+
+def get_feed_page(user_ids, cursor=None, page_size=20, viewer_id=None):
+    """
+    Fetch one page of the merged ticket/review stream of `user_ids`.
+
+    Only `page_size + 1` keys are read from the database, whatever the size of the history,
+    and the matching instances are then loaded by primary key.
+
+    Parameters:
+    user_ids: iterable of Integers
+        The authors whose posts make up the stream.
+    cursor: str, optional
+        Cursor returned with the previous page; None for the newest posts.
+    page_size: int
+        Number of posts per page.
+    viewer_id: int, optional
+        The user reading the stream, see `load_posts`.
+
+    Returns:
+    FeedPage
+    """
+    position = decode_cursor(cursor) if cursor else None
+    rows = merged_posts_query(user_ids, position)[:page_size + 1]
+    rows, next_cursor = paginate_rows(rows, page_size)
+    return FeedPage(load_posts(rows, viewer_id), next_cursor)
+
+
+def estimate_row_count(model):
+    """
+    Estimate the number of rows of a table without counting them.
+
+    PostgreSQL keeps an estimate in its statistics. Elsewhere, the largest auto-incremented
+    primary key, read from the end of its index, is an upper bound of the number of rows.
+    """
+    connection = connections[router.db_for_read(model)]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] > 0:
+            return row[0]
+    return model._default_manager.aggregate(largest=Max('pk'))['largest'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator of the admin changelists, which never counts more than `count_limit` rows.
+
+    `COUNT(*)` reads a whole table or index, which takes seconds on millions of tickets. Lists
+    up to the limit are counted exactly; beyond it, unfiltered lists are given an estimate of
+    the size of the table, see `estimate_row_count`, and filtered lists the limit itself.
+    """
+    count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        count = queryset.order_by()[:self.count_limit].count()
+        if count < self.count_limit or queryset.query.has_filters():
+            return count
+        return max(estimate_row_count(queryset.model), count)
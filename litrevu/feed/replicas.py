@@ -0,0 +1,176 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db import connections
+
+REPLICA_DB_ALIAS = 'replica'
+
+# Cookie sent after a request wrote to the database, sending the reads of the user to the primary
+# until the replica has caught up.
+PIN_COOKIE = 'primary_pin'
+
+# Whether the reads of the current request or task may be served by the replica
+replica_reads = ContextVar('replica_reads', default=False)
+
+# Writes of the current request, recorded by the router; None outside of `PrimaryPinningMiddleware`
+request_writes = ContextVar('request_writes', default=None)
+
+
+def has_replica():
+    """
+    Tell whether a replica distinct from the primary database is configured.
+
+    During tests the replica mirrors the primary (`TEST["MIRROR"]`). It is then read through the
+    primary connection, the only one seeing the data written by the running test.
+    """
+    if REPLICA_DB_ALIAS not in settings.DATABASES:
+        return False
+    replica, primary = connections[REPLICA_DB_ALIAS].settings_dict, connections[DEFAULT_DB_ALIAS].settings_dict
+    return any(replica[key] != primary[key] for key in ('ENGINE', 'NAME', 'HOST', 'PORT'))
+
+
+@contextmanager
+def read_from_replica():
+    """
+    Route the reads issued inside the block to the replica, when one is configured.
+    """
+    token = replica_reads.set(True)
+    try:
+        yield
+    finally:
+        replica_reads.reset(token)
+
+
+@contextmanager
+def read_from_primary():
+    """
+    Route the reads issued inside the block to the primary, even within a view reading from the replica.
+
+    Data stored in the shared cache must be loaded from the primary: a copy read from the lagging
+    replica would outlive the lag, e.g. cached under a version counter a write already bumped.
+    """
+    token = replica_reads.set(False)
+    try:
+        yield
+    finally:
+        replica_reads.reset(token)
+
+
+def is_reading_from_replica():
+    """
+    Tell whether the reads of the current request or task are routed to a replica.
+    """
+    return replica_reads.get() and has_replica()
+
+
+def iter_on_replica(iterator):
+    """
+    Consume an iterator, e.g. the content of a streaming response, reading from the replica.
+
+    The reads of a streaming response happen after the view returned, while the response is
+    sent, so the routing hint is set again around every step.
+    """
+    iterator = iter(iterator)
+    while True:
+        with read_from_replica():
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def is_pinned_to_primary(request):
+    """
+    Tell whether the user wrote recently, so that their reads must see their own writes.
+    """
+    return PIN_COOKIE in request.COOKIES
+
+
+class ReplicaRouter:
+    """
+    Send the reads of the views using `ReplicaReadMixin` to the replica, everything else to the primary.
+
+    Without a `replica` database, every query goes to the default one. Sessions, which decide
+    who is logged in and are cached by the `cached_db` engine, are always read from the primary.
+    Writes are always sent to the primary and recorded, so that `PrimaryPinningMiddleware` can
+    pin the user to it.
+    """
+    PRIMARY_MODELS = {'sessions.Session'}
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label not in self.PRIMARY_MODELS and is_reading_from_replica():
+            return REPLICA_DB_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        writes = request_writes.get()
+        if writes is not None:
+            writes.add(model._meta.label)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives its schema from the primary
+        return db != REPLICA_DB_ALIAS
+
+
+class PrimaryPinningMiddleware:
+    """
+    Pin the reads of a user to the primary for a while after one of their requests wrote to it.
+
+    The replica lags behind the primary, so a page displayed right after a form was submitted
+    could miss the post that was just created. A short-lived cookie makes `ReplicaReadMixin`
+    read from the primary until `DATABASE_REPLICA_PIN_SECONDS` have elapsed.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writes = set()
+        token = request_writes.set(writes)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_writes.reset(token)
+
+        if writes and has_replica():
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.DATABASE_REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+
+
+class ReplicaReadMixin:
+    """
+    Serve the GET and HEAD requests of a view from the replica database.
+
+    Requests of users pinned to the primary, see `PrimaryPinningMiddleware`, and requests that
+    may write are left on the primary. Both sync and async views are supported.
+    """
+    def reads_from_replica(self, request):
+        return request.method in ('GET', 'HEAD') and not is_pinned_to_primary(request)
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.reads_from_replica(request):
+            return super().dispatch(request, *args, **kwargs)
+        if self.view_is_async:
+            return self.adispatch_on_replica(request, *args, **kwargs)
+
+        with read_from_replica():
+            response = super().dispatch(request, *args, **kwargs)
+        if response.streaming:
+            response.streaming_content = iter_on_replica(response.streaming_content)
+        return response
+
+    async def adispatch_on_replica(self, request, *args, **kwargs):
+        # The hint is inherited by the ORM calls run in worker threads by sync_to_async
+        with read_from_replica():
+            response = super().dispatch(request, *args, **kwargs)
+            if hasattr(response, '__await__'):
+                response = await response
+        return response
@@ -0,0 +1,109 @@
+from django.db.models import Count
+from django.db.models import F
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.db.models.functions import Greatest
+from feed.fragments import bump_author_version
+from feed.fragments import bump_post_version
+from feed.models import TICKET
+from feed.models import Ticket
+
+
+def update_review_stats(ticket, count_delta, rating_delta):
+    """
+    Apply a change to the review aggregates of a ticket with a single atomic UPDATE.
+
+    The columns are incremented with F() expressions, so concurrent reviews never overwrite
+    each other's changes. They never go below zero, even when a review that was never counted
+    is removed: a drift is left to `reconcile_review_stats`. `QuerySet.update` sends no signal,
+    so the cached fragments of the ticket and the ETags of its author's posts are invalidated here.
+
+    Parameters:
+    ticket: Ticket
+        The reviewed ticket.
+    count_delta: int
+        The change of the number of reviews.
+    rating_delta: int
+        The change of the sum of the ratings.
+    """
+    Ticket.objects.filter(pk=ticket.pk).update(review_count=Greatest(F('review_count') + count_delta, 0),
+                                               rating_sum=Greatest(F('rating_sum') + rating_delta, 0))
+    bump_post_version(TICKET, ticket.pk)
+    bump_author_version(ticket.user_id)
+
+
+def add_review(review):
+    """
+    Count a newly created review in the aggregates of its ticket.
+    """
+    update_review_stats(review.ticket, 1, review.rating)
+
+
+def change_review_rating(review, old_rating):
+    """
+    Update the aggregates of the ticket of a review whose rating changed.
+    """
+    if review.rating != old_rating:
+        update_review_stats(review.ticket, 0, review.rating - old_rating)
+
+
+def move_review(review, old_ticket, old_rating):
+    """
+    Move a review whose ticket changed from the aggregates of its former ticket to the new one.
+    """
+    update_review_stats(old_ticket, -1, -old_rating)
+    add_review(review)
+
+
+def remove_review(review):
+    """
+    Remove a deleted review from the aggregates of its ticket.
+    """
+    update_review_stats(review.ticket, -1, -review.rating)
+
+
+def remove_reviews(reviews):
+    """
+    Remove the reviews of a queryset, about to be deleted, from the aggregates of their tickets.
+
+    The reviews are grouped by ticket, so that one UPDATE is issued per ticket.
+    """
+    totals = (reviews.order_by().values('ticket_id', 'ticket__user_id')
+              .annotate(count=Count('id'), ratings=Sum('rating')))
+    for total in totals:
+        ticket = Ticket(pk=total['ticket_id'], user_id=total['ticket__user_id'])
+        update_review_stats(ticket, -total['count'], -total['ratings'])
+
+
+def reconcile_review_stats(batch_size=1000):
+    """
+    Recompute the review aggregates of every ticket and fix the ones that drifted.
+
+    Tickets are read in batches of IDs, each batch with its actual aggregates computed by the
+    database in one query, and the wrong ones are written back with `bulk_update`.
+
+    Returns:
+    int
+        The number of fixed tickets.
+    """
+    fixed, last_id = 0, 0
+    while True:
+        tickets = list(
+            Ticket.objects.filter(id__gt=last_id).order_by('id')
+            .annotate(actual_count=Count('review'), actual_sum=Coalesce(Sum('review__rating'), 0))
+            .only('id', 'user_id', 'review_count', 'rating_sum')[:batch_size]
+        )
+        if not tickets:
+            return fixed
+        last_id = tickets[-1].id
+
+        drifted = [ticket for ticket in tickets
+                   if (ticket.review_count, ticket.rating_sum) != (ticket.actual_count, ticket.actual_sum)]
+        for ticket in drifted:
+            ticket.review_count, ticket.rating_sum = ticket.actual_count, ticket.actual_sum
+        if drifted:
+            Ticket.objects.bulk_update(drifted, Ticket.COUNTER_FIELDS)
+            for ticket in drifted:
+                bump_post_version(TICKET, ticket.pk)
+                bump_author_version(ticket.user_id)
+        fixed += len(drifted)
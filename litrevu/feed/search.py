@@ -0,0 +1,254 @@
+import re
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db import connection
+from django.db import connections
+from django.db import router
+from django.db import transaction
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from feed.models import REVIEW
+from feed.models import TICKET
+from feed.models import Review
+from feed.models import Ticket
+from feed.pagination import load_posts
+
+SEARCH_TABLE = 'feed_post_search'
+
+# Delimiters of the matched terms in the snippets, replaced with <mark> tags once the text is escaped
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+SEARCH_TERM = re.compile(r'\w+')
+
+# Triggers keeping the index in sync, created by migration 0008. SQLite drops the triggers of a
+# table when Django rebuilds it to alter its schema, so they are recreated after every migration.
+# Posts are indexed under rowid 2 * id for tickets and 2 * id + 1 for reviews, see `get_search_rowid`.
+SEARCH_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS feed_ticket_search_insert AFTER INSERT ON feed_ticket BEGIN
+        INSERT INTO {SEARCH_TABLE} (rowid, title, body, content_type, post_id, user_id)
+        VALUES (new.id * 2, new.title, new.description, '{TICKET}', new.id, new.user_id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS feed_ticket_search_update AFTER UPDATE OF title, description ON feed_ticket BEGIN
+        UPDATE {SEARCH_TABLE} SET title = new.title, body = new.description WHERE rowid = new.id * 2;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS feed_ticket_search_delete AFTER DELETE ON feed_ticket BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id * 2;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS feed_review_search_insert AFTER INSERT ON feed_review BEGIN
+        INSERT INTO {SEARCH_TABLE} (rowid, title, body, content_type, post_id, user_id)
+        VALUES (new.id * 2 + 1, new.headline, new.body, '{REVIEW}', new.id, new.user_id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS feed_review_search_update AFTER UPDATE OF headline, body ON feed_review BEGIN
+        UPDATE {SEARCH_TABLE} SET title = new.headline, body = new.body WHERE rowid = new.id * 2 + 1;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS feed_review_search_delete AFTER DELETE ON feed_review BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id * 2 + 1;
+    END
+    """,
+]
+
+
+def is_search_available():
+    """
+    Tell whether the database supports the full-text index, which is an SQLite FTS5 table.
+    """
+    return connection.vendor == 'sqlite'
+
+
+def ensure_search_triggers(using=DEFAULT_DB_ALIAS):
+    """
+    Recreate the triggers of the full-text index that a table rebuild may have dropped.
+
+    Returns:
+    bool
+        Whether the index exists on this database.
+    """
+    database = connections[using]
+    if database.vendor != 'sqlite' or SEARCH_TABLE not in database.introspection.table_names():
+        return False
+    with database.cursor() as cursor:
+        for statement in SEARCH_TRIGGERS:
+            cursor.execute(statement)
+    return True
+
+
+def get_search_rowid(content_type, pk):
+    """
+    Map a post to the rowid of its row in the index: tickets get even rowids, reviews odd ones.
+    """
+    return pk * 2 + (content_type == REVIEW)
+
+
+def build_match_query(text):
+    """
+    Turn the text typed by the user into an FTS5 query matching posts containing every word.
+
+    Words are quoted, so that the FTS5 query syntax can not be injected, and the last one is
+    matched as a prefix, as it is often being typed.
+
+    Returns:
+    str or None
+        None when the text contains no word.
+    """
+    terms = SEARCH_TERM.findall(text)
+    if not terms:
+        return None
+    phrases = [f'"{term}"' for term in terms]
+    phrases[-1] += '*'
+    return " ".join(phrases)
+
+
+def match_posts(content_type, text, column='title'):
+    """
+    Build a subquery selecting the IDs of the tickets or reviews whose title (or body) matches a text.
+
+    It is meant for `pk__in` filters, such as the admin searches: the matching is done by the
+    index, without loading any ID in Python.
+
+    Parameters:
+    content_type: str
+        `TICKET` or `REVIEW`.
+    text: str
+        The text typed by the user, see `build_match_query`.
+    column: str
+        `title` (ticket titles and review headlines) or `body` (descriptions and review bodies).
+
+    Returns:
+    RawSQL or None
+        None when the text contains no word.
+    """
+    query = build_match_query(text)
+    if query is None:
+        return None
+    sql = f"SELECT post_id FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND content_type = %s"  # nosec B608
+    return RawSQL(sql, [f"{column} : ({query})", content_type])
+
+
+def highlight(snippet):
+    """
+    Escape a snippet returned by FTS5 and wrap its matched terms in <mark> tags.
+    """
+    html = escape(snippet).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+    return mark_safe(html)  # nosec B308 B703
+
+
+class SearchResult:
+    """
+    A post matching a search, with the highlighted excerpts of its title and text.
+    """
+    def __init__(self, post, title, body):
+        self.post = post
+        self.title = title
+        self.body = body
+
+
+def search_posts(text, author_ids, viewer_id, page=1, page_size=20):
+    """
+    Search the tickets and reviews of some authors, best matches first.
+
+    Results are ranked with BM25, a match in the title (or headline) weighing more than one in
+    the description (or body). Only the rows of the requested page, plus one to tell whether
+    another page follows, are read from the index.
+
+    Parameters:
+    text: str
+        The text typed by the user.
+    author_ids: iterable of Integers
+        The authors whose posts the user can see, i.e. themselves and the users they follow.
+    viewer_id: int
+        The user searching, see `feed.pagination.load_posts`.
+    page: int
+        The 1-based number of the page.
+    page_size: int
+        Number of results per page.
+
+    Returns:
+    tuple (list of SearchResult, bool)
+        The results of the page, and whether there is a next page.
+    """
+    query = build_match_query(text)
+    author_ids = list(author_ids)
+    if query is None or not author_ids:
+        return [], False
+
+    placeholders = ", ".join(["%s"] * len(author_ids))
+    sql = (
+        "SELECT content_type, post_id, "
+        f"snippet({SEARCH_TABLE}, 0, %s, %s, '…', 16), "
+        f"snippet({SEARCH_TABLE}, 1, %s, %s, '…', 32) "
+        f"FROM {SEARCH_TABLE} "
+        f"WHERE {SEARCH_TABLE} MATCH %s AND user_id IN ({placeholders}) "
+        f"ORDER BY bm25({SEARCH_TABLE}, 4.0, 1.0) "
+        "LIMIT %s OFFSET %s"
+    )  # nosec B608
+    params = [MATCH_START, MATCH_END, MATCH_START, MATCH_END, query, *author_ids,
+              page_size + 1, (page - 1) * page_size]
+    # Read from the database the ORM would use, e.g. the replica, see `feed.replicas`
+    with connections[router.db_for_read(Ticket)].cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+
+    # Load the posts with the same queries as the feed, then attach their excerpts
+    posts = load_posts([(content_type, post_id, None) for content_type, post_id, _, _ in rows], viewer_id)
+    excerpts = {(content_type, post_id): (title, body) for content_type, post_id, title, body in rows}
+    results = []
+    for post in posts:
+        title, body = excerpts[(post.content_type, post.pk)]
+        results.append(SearchResult(post, highlight(title), highlight(body)))
+    return results, has_next
+
+
+def iter_search_rows(model, content_type, title_field, body_field, chunk_size):
+    """
+    Yield the index rows of every ticket or review, streamed from the database in chunks.
+    """
+    rows = model.objects.order_by().values_list('id', 'user_id', title_field, body_field)
+    for pk, user_id, title, body in rows.iterator(chunk_size=chunk_size):
+        yield get_search_rowid(content_type, pk), title, body, content_type, pk, user_id
+
+
+def rebuild_search_index(chunk_size=1000):
+    """
+    Rebuild the full-text index from the tickets and reviews.
+
+    Rows are inserted in chunks, so that the posts are never all held in memory, then the
+    index is merged into a single b-tree for faster queries.
+
+    Returns:
+    int
+        The number of indexed posts.
+    """
+    sql = (f"INSERT INTO {SEARCH_TABLE} (rowid, title, body, content_type, post_id, user_id) "
+           f"VALUES (%s, %s, %s, %s, %s, %s)")  # nosec B608
+    total = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")  # nosec B608
+        for source in ((Ticket, TICKET, 'title', 'description'), (Review, REVIEW, 'headline', 'body')):
+            chunk = []
+            for row in iter_search_rows(*source, chunk_size):
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    cursor.executemany(sql, chunk)
+                    total += len(chunk)
+                    chunk = []
+            if chunk:
+                cursor.executemany(sql, chunk)
+                total += len(chunk)
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")  # nosec B608
+    return total
@@ -0,0 +1,85 @@
+from django.core.files.storage import default_storage
+from django.db.models import Exists
+from django.db.models import OuterRef
+from feed.models import REVIEW
+from feed.models import TICKET
+from feed.models import Review
+from feed.models import Ticket
+from feed.pagination import group_row_ids
+
+TICKET_FIELDS = ['id', 'title', 'description', 'image', 'time_create', 'user__username', 'review_count', 'rating_sum']
+REVIEW_FIELDS = ['id', 'headline', 'rating', 'body', 'time_create', 'user__username',
+                 'ticket_id', 'ticket__title', 'ticket__image', 'ticket__user__username']
+
+
+def get_image_url(name):
+    return default_storage.url(name) if name else None
+
+
+def serialize_ticket(values):
+    return {
+        'type': TICKET.lower(),
+        'id': values['id'],
+        'time_create': values['time_create'].isoformat(),
+        'user': values['user__username'],
+        'title': values['title'],
+        'description': values['description'],
+        'image': get_image_url(values['image']),
+        'is_reviewed': values['is_reviewed'],
+        'review_count': values['review_count'],
+        'average_rating': values['rating_sum'] / values['review_count'] if values['review_count'] else None,
+    }
+
+
+def serialize_review(values):
+    return {
+        'type': REVIEW.lower(),
+        'id': values['id'],
+        'time_create': values['time_create'].isoformat(),
+        'user': values['user__username'],
+        'headline': values['headline'],
+        'rating': values['rating'],
+        'body': values['body'],
+        'ticket': {
+            'id': values['ticket_id'],
+            'title': values['ticket__title'],
+            'user': values['ticket__user__username'],
+            'image': get_image_url(values['ticket__image']),
+        },
+    }
+
+
+def serialize_posts(rows, viewer_id):
+    """
+    Turn `(content_type, id, time_create)` rows into JSON-ready dictionaries, preserving their order.
+
+    Like `feed.pagination.load_posts`, one query is issued per content type, but only the
+    displayed columns are read, as dictionaries, so that no model instance is built.
+
+    Parameters:
+    rows: list of tuples
+        Rows as returned by `feed.timeline.get_timeline_rows`.
+    viewer_id: int
+        The user reading the posts; tickets tell whether this user already reviewed them.
+
+    Returns:
+    list of dict
+    """
+    ids = group_row_ids(rows)
+    values = {TICKET: {}, REVIEW: {}}
+    if ids[TICKET]:
+        tickets = Ticket.objects.filter(id__in=ids[TICKET]).annotate(
+            is_reviewed=Exists(Review.objects.filter(ticket=OuterRef('pk'), user_id=viewer_id))
+        )
+        values[TICKET] = {ticket['id']: ticket for ticket in tickets.values(*TICKET_FIELDS, 'is_reviewed')}
+    if ids[REVIEW]:
+        reviews = Review.objects.filter(id__in=ids[REVIEW]).values(*REVIEW_FIELDS)
+        values[REVIEW] = {review['id']: review for review in reviews}
+
+    serializers = {TICKET: serialize_ticket, REVIEW: serialize_review}
+    posts = []
+    for content_type, pk, _ in rows:
+        # Rows whose post disappeared in the meantime are skipped
+        if pk in values[content_type]:
+            posts.append(serializers[content_type](values[content_type][pk]))
+    return posts
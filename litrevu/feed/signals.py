@@ -0,0 +1,95 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+from feed.fragments import bump_author_version
+from feed.fragments import bump_post_version
+from feed.images import release_image
+from feed.models import REVIEW
+from feed.models import TICKET
+from feed.models import Review
+from feed.models import Ticket
+from feed.timeline import remove_post
+
+
+@receiver(post_delete, sender=Ticket)
+def remove_ticket_from_timelines(sender, instance, **kwargs):
+    """
+    Drop a deleted ticket from every materialized timeline.
+    """
+    remove_post(TICKET, instance.pk)
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_from_timelines(sender, instance, **kwargs):
+    """
+    Drop a deleted review from every materialized timeline.
+    """
+    remove_post(REVIEW, instance.pk)
+
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_delete, sender=Ticket)
+def invalidate_ticket_fragments(sender, instance, **kwargs):
+    """
+    Invalidate the cached fragments of a ticket and of the reviews embedding it.
+    """
+    bump_post_version(TICKET, instance.pk)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_review_fragments(sender, instance, **kwargs):
+    """
+    Invalidate the cached fragments of a review.
+    """
+    bump_post_version(REVIEW, instance.pk)
+
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_delete, sender=Ticket)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_author_posts(sender, instance, created=False, **kwargs):
+    """
+    Change the version of the posts of an author, which the feed ETags are computed from.
+
+    An edited ticket also changes the reviews embedding it, so their authors are bumped as well.
+    """
+    bump_author_version(instance.user_id)
+    if sender is Ticket and kwargs.get('signal') is post_save and not created:
+        for user_id in set(Review.objects.filter(ticket=instance).values_list('user_id', flat=True)):
+            bump_author_version(user_id)
+
+
+@receiver(pre_save, sender=Ticket)
+def remember_replaced_image(sender, instance, update_fields=None, **kwargs):
+    """
+    Note the image a ticket had before it is saved, to release it if it gets replaced or cleared.
+    """
+    instance._previous_image = None
+    if instance.pk is None or instance._state.adding or (update_fields is not None and 'image' not in update_fields):
+        return
+    instance._previous_image = Ticket.objects.filter(pk=instance.pk).values_list('image', flat=True).first()
+
+
+@receiver(post_save, sender=Ticket)
+def release_replaced_image(sender, instance, **kwargs):
+    """
+    Release the previous image of an updated ticket, once no ticket references it anymore.
+    """
+    previous = getattr(instance, '_previous_image', None)
+    if previous and previous != instance.image.name:
+        transaction.on_commit(partial(release_image, previous, instance.image.storage))
+
+
+@receiver(post_delete, sender=Ticket)
+def release_deleted_image(sender, instance, **kwargs):
+    """
+    Release the image of a deleted ticket, once no ticket references it anymore.
+    """
+    if instance.image:
+        transaction.on_commit(partial(release_image, instance.image.name, instance.image.storage))
@@ -31,3 +31,51 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     });
 });
+
+// Suggest usernames while typing in the follow form, querying the server once the user pauses typing.
+document.addEventListener('DOMContentLoaded', () => {
+    // Fetches the username input of the follow form, which carries the URL of the autocomplete endpoint
+    const usernameInput = document.querySelector('[data-autocomplete-url]');
+    if (!usernameInput) {
+        return;
+    }
+    const suggestions = document.getElementById(usernameInput.getAttribute('list'));
+    const delay = 200;
+    let timer = null;
+    let controller = null;
+
+    usernameInput.addEventListener('input', () => {
+        // Restarts the countdown on every keystroke, so that only the last one triggers a request
+        clearTimeout(timer);
+        timer = setTimeout(() => {
+            const query = usernameInput.value.trim();
+            if (!query) {
+                suggestions.replaceChildren();
+                return;
+            }
+
+            // Cancels the request still in flight, whose results would be outdated
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+
+            const url = `${usernameInput.dataset.autocompleteUrl}?q=${encodeURIComponent(query)}`;
+            fetch(url, {signal: controller.signal, headers: {'Accept': 'application/json'}})
+                .then((response) => response.ok ? response.json() : {results: []})
+                .then((data) => {
+                    // Replaces the options of the datalist with the suggested usernames
+                    suggestions.replaceChildren(...data.results.map((username) => {
+                        const option = document.createElement('option');
+                        option.value = username;
+                        return option;
+                    }));
+                })
+                .catch((error) => {
+                    if (error.name !== 'AbortError') {
+                        console.error(error);
+                    }
+                });
+        }, delay);
+    });
+});
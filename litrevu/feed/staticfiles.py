@@ -0,0 +1,151 @@
+import gzip
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse
+from django.http import HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, only gzip copies are generated without it
+    brotli = None
+
+# Extensions of the text files worth compressing; images and fonts are already compressed
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.map', '.json', '.svg', '.txt', '.html', '.xml'}
+
+# Precompressed variants, in order of preference, with the suffix of their files
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+# Hashed files never change, other files (e.g. referenced by their original name) are revalidated
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=60'
+
+
+def compress_file(path):
+    """
+    Write the gzip (and, when the brotli package is installed, brotli) versions of a static file.
+
+    A compressed version is only kept when it is smaller than the original.
+
+    Returns:
+    list of str
+        The paths of the written files.
+    """
+    with open(path, 'rb') as file:
+        content = file.read()
+
+    compressors = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        compressors.append(('.br', lambda data: brotli.compress(data, quality=11)))
+
+    written = []
+    for suffix, compress in compressors:
+        compressed = compress(content)
+        if len(compressed) < len(content):
+            with open(path + suffix, 'wb') as file:
+                file.write(compressed)
+            written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Static files storage adding the hash of their content to the file names, and precompressing them.
+
+    Once `collectstatic` copied and hashed the files, the text ones are compressed with gzip and
+    brotli, so that `StaticFilesMiddleware` can serve them without compressing on every request.
+    """
+    def post_process(self, paths, dry_run=False, **options):
+        processed = set()
+        for name, hashed_name, post_processed in super().post_process(paths, dry_run, **options):
+            if hashed_name:
+                processed.update((name, hashed_name))
+            yield name, hashed_name, post_processed
+
+        if dry_run:
+            return
+        for name in sorted(processed):
+            if os.path.splitext(name)[1] in COMPRESSIBLE_EXTENSIONS and self.exists(name):
+                compress_file(self.path(name))
+
+
+def get_encoding(request, path):
+    """
+    Choose the best precompressed version of a file that the client accepts.
+
+    Returns:
+    tuple (str, str or None)
+        The path of the file to send, and its content encoding (None for the original file).
+    """
+    accepted = {encoding.split(';')[0].strip()
+                for encoding in request.headers.get('Accept-Encoding', '').split(',')}
+    for encoding, suffix in ENCODINGS:
+        if encoding in accepted and os.path.isfile(path + suffix):
+            return path + suffix, encoding
+    return path, None
+
+
+class StaticFilesMiddleware:
+    """
+    Serve the collected static files from `STATIC_ROOT`, so that no separate web server is needed.
+
+    Files whose name carries the hash of their content are cached by browsers for a year
+    without revalidation. Precompressed versions are sent to clients accepting them, and
+    `Vary: Accept-Encoding` keeps shared caches from mixing them up. Requests for files that
+    were not collected fall through to the rest of the stack.
+    """
+    HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/')
+        self.root = settings.STATIC_ROOT
+        self.hashed_names = None
+
+    def __call__(self, request):
+        if self.root and request.method in ('GET', 'HEAD') and request.path.startswith(self.prefix):
+            response = self.serve(request, request.path[len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def is_immutable(self, name):
+        if self.hashed_names is None:
+            # Names listed in the manifest written by collectstatic, if the storage keeps one
+            self.hashed_names = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+        if self.hashed_names:
+            return name in self.hashed_names
+        return bool(self.HASHED_NAME.search(name))
+
+    def serve(self, request, name):
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path) or os.path.splitext(path)[1] in ('.gz', '.br'):
+            return None
+
+        stat = os.stat(path)
+        cache_control = IMMUTABLE_CACHE_CONTROL if self.is_immutable(name) else DEFAULT_CACHE_CONTROL
+        if not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime):
+            response = HttpResponseNotModified()
+        else:
+            path, encoding = get_encoding(request, path)
+            content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            # Name the file after the asset, not after its precompressed copy
+            response = FileResponse(open(path, 'rb'), content_type=content_type, filename=os.path.basename(name))
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.headers['Last-Modified'] = http_date(stat.st_mtime)
+        response.headers['Cache-Control'] = cache_control
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
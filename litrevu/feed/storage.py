@@ -0,0 +1,68 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+# Prefix of the temporary files uploads are streamed to, before they are named after their hash
+UPLOAD_PREFIX = '.upload-'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage naming every file after the SHA-256 hash of its content.
+
+    `tickets/cover.jpg` is stored as `tickets/<h1h2>/<hash>.jpg`, where `h1h2` are the first two
+    hexadecimal digits of the hash, so that identical uploads share one file, one URL and one
+    browser cache entry, and no directory grows too large. The content is hashed while it is
+    streamed to a temporary file, which is then moved in place, or dropped if the file exists.
+
+    A stored file may be referenced by several tickets: it must only be deleted once none
+    references it anymore, see `feed.images.release_image`.
+    """
+    def get_hashed_name(self, name, digest):
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.generate_filename(name)
+
+        # Stream the upload to a temporary file of the destination directory, hashing it on the way
+        directory = self.path(posixpath.dirname(name))
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=directory, prefix=UPLOAD_PREFIX, delete=False) as temporary:
+            for chunk in content.chunks():
+                digest.update(chunk)
+                temporary.write(chunk)
+
+        hashed_name = self.get_hashed_name(name, digest.hexdigest())
+        path = self.path(hashed_name)
+        if os.path.exists(path):
+            # The same content is already stored; refresh its modification time, so that the orphaned
+            # media collector, which spares recent files, does not delete it before the ticket is saved
+            os.unlink(temporary.name)
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temporary.name, path)
+            if self.file_permissions_mode is not None:
+                os.chmod(path, self.file_permissions_mode)
+        return hashed_name.replace('\\', '/')
+
+
+ticket_image_storage = ContentAddressedStorage()
+
+
+def get_ticket_image_storage():
+    """
+    Return the storage of ticket images; referenced by the migrations, which can not serialize it.
+    """
+    return ticket_image_storage
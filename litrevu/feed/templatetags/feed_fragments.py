@@ -0,0 +1,15 @@
+from django import template
+from django.utils.safestring import mark_safe
+from feed.fragments import render_post as render_post_fragment
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def render_post(context, post):
+    """
+    Render the ticket or review snippet of a feed post through the fragment cache.
+
+    Usage: {% render_post post %}
+    """
+    return mark_safe(render_post_fragment(post, context['user']))  # nosec B308 B703
@@ -0,0 +1,17 @@
+from django import template
+from feed.images import get_srcsets
+
+register = template.Library()
+
+
+@register.inclusion_tag('snippets/ticket_image.html')
+def ticket_image(ticket):
+    """
+    Render the image of a ticket with `srcset` attributes pointing at its resized variants.
+
+    Usage: {% ticket_image ticket %}
+    """
+    return {
+        'ticket': ticket,
+        'srcsets': get_srcsets(ticket.image.name, ticket.image.storage) if ticket.image else None,
+    }
@@ -1,3 +1,491 @@
-# from django.test import TestCase
+import importlib
+import os
+import time
+from io import BytesIO
+from io import StringIO
+from tempfile import TemporaryDirectory
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Exists
+from django.db.models import OuterRef
+from django.test import RequestFactory
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+from feed.benchmarking import measure_requests
+from feed.benchmarking import percentile
+from feed.fragments import bump_post_version
+from feed.fragments import render_post
+from feed.images import release_image
+from feed.media import UnsatisfiableRange
+from feed.media import parse_range
+from feed.models import TICKET
+from feed.models import Review
+from feed.models import Ticket
+from feed.models import TimelineEntry
+from feed.orphans import is_still_orphaned
+from feed.orphans import iter_media_files
+from feed.pagination import load_posts
+from feed.pagination import merged_posts_query
+from feed.replicas import REPLICA_DB_ALIAS
+from feed.replicas import ReplicaRouter
+from feed.replicas import read_from_primary
+from feed.replicas import read_from_replica
+from feed.staticfiles import StaticFilesMiddleware
+from feed.staticfiles import compress_file
+from feed.storage import ticket_image_storage
+from feed.timeline import aget_timeline_page
+from feed.timeline import get_timeline_rows
+from feed.timeline import timeline_rows_query
+from PIL import Image
+from users.follow_graph import get_follow_graph
+from users.models import CustomUser
+from users.models import UserFollows
+
+
+class FeedIndexTests(TestCase):
+    """
+    Check with EXPLAIN that the feed, posts and follow lookups are served by their indexes.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(username='author', password='password')
+        cls.reader = CustomUser.objects.create_user(username='reader', password='password')
+        UserFollows.objects.create(user=cls.reader, followed_user=cls.author)
+        ticket = Ticket.objects.create(user=cls.author, title="Ticket")
+        Review.objects.create(user=cls.author, ticket=ticket, headline="Review", rating=3)
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan, f"{index} is not used by:\n{plan}")
+
+    def test_posts_of_a_user_use_ticket_user_time_idx(self):
+        tickets = Ticket.objects.filter(user=self.author).order_by('-time_create')
+        self.assertUsesIndex(tickets, 'ticket_user_time_idx')
+
+    def test_posts_of_a_user_use_review_user_time_idx(self):
+        reviews = Review.objects.filter(user=self.author).order_by('-time_create')
+        self.assertUsesIndex(reviews, 'review_user_time_idx')
+
+    def test_merged_feed_query_uses_both_post_indexes(self):
+        query = merged_posts_query([self.author.id, self.reader.id])
+        self.assertUsesIndex(query, 'ticket_user_time_idx')
+        self.assertUsesIndex(query, 'review_user_time_idx')
+
+    def test_reviewed_flag_uses_review_user_ticket_idx(self):
+        tickets = Ticket.objects.annotate(
+            is_reviewed=Exists(Review.objects.filter(ticket=OuterRef('pk'), user=self.reader))
+        )
+        self.assertUsesIndex(tickets, 'review_user_ticket_idx')
+
+    def test_followers_lookup_uses_userfollows_followed_user_idx(self):
+        followers = UserFollows.objects.filter(followed_user=self.author).values_list('user_id', flat=True)
+        self.assertUsesIndex(followers, 'userfollows_followed_user_idx')
+
+    def test_timeline_page_uses_timeline_owner_time_idx(self):
+        self.assertUsesIndex(timeline_rows_query(self.reader.id)[:21], 'timeline_owner_time_idx')
+
+
+class BenchmarkTests(TestCase):
+    """
+    Exercise the synthetic data generator and the measurement helpers of the benchmark suite.
+    """
+    def setUp(self):
+        cache.clear()
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_seed_creates_users_posts_and_timelines(self):
+        call_command('seed_litrevu', users=20, follows=3, tickets=2, reviews=2, seed=1, stdout=StringIO())
+        users = CustomUser.objects.filter(username__startswith='seed_')
+        self.assertEqual(users.count(), 20)
+        self.assertTrue(UserFollows.objects.exists())
+        self.assertTrue(Ticket.objects.exists())
+        self.assertTrue(TimelineEntry.objects.filter(owner__in=users).exists())
+
+    def test_measure_requests_reports_queries_and_errors(self):
+        user = CustomUser.objects.create_user(username='reader', password='password')
+        self.client.force_login(user)
+        summary = measure_requests(lambda index: self.client.get(reverse('feed')), iterations=3, warmup=1)
+        self.assertEqual(summary['requests'], 3)
+        self.assertEqual(summary['errors'], 0)
+        self.assertGreater(summary['queries_p50'], 0)
+
+
+@override_settings(SHARED_CACHE=True)
+@mock.patch('feed.replicas.has_replica', return_value=True)
+class ReplicaCacheTests(TestCase):
+    """
+    Check that the data written to the shared cache is read from the primary, not from the replica.
+
+    The test database has no `replica` alias: a query routed to it would fail.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(username='author', password='password')
+        cls.reader = CustomUser.objects.create_user(username='reader', password='password')
+        UserFollows.objects.create(user=cls.reader, followed_user=cls.author)
+        cls.ticket = Ticket.objects.create(user=cls.author, title="Ticket")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_router(self, has_replica):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Ticket))
+        with read_from_replica():
+            self.assertEqual(router.db_for_read(Ticket), REPLICA_DB_ALIAS)
+            self.assertIsNone(router.db_for_read(Session))
+            with read_from_primary():
+                self.assertIsNone(router.db_for_read(Ticket))
+
+    def test_follow_graph_is_loaded_from_the_primary(self, has_replica):
+        with read_from_replica():
+            graph = get_follow_graph(self.author.id)
+        self.assertEqual(graph['followers'], [(self.reader.id, 'reader')])
+
+    def test_fragment_misses_are_rendered_from_the_primary(self, has_replica):
+        post = load_posts([(TICKET, self.ticket.id, self.ticket.time_create)], viewer_id=self.reader.id)[0]
+        # The replica lags behind an edit whose version was already bumped
+        Ticket.objects.filter(pk=self.ticket.pk).update(title="Edited ticket")
+        bump_post_version(TICKET, self.ticket.pk)
+        with read_from_replica():
+            fragment = render_post(post, self.reader)
+        self.assertIn("Edited ticket", fragment)
+
+
+class FragmentCacheTests(TestCase):
+    """
+    Check that the feed fragments are only cached with a cache shared by all the processes.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = CustomUser.objects.create_user(username='reader', password='password')
+        cls.ticket = Ticket.objects.create(user=cls.reader, title="Ticket")
+
+    def setUp(self):
+        cache.clear()
+
+    def render_ticket(self):
+        post = load_posts([(TICKET, self.ticket.id, self.ticket.time_create)], viewer_id=self.reader.id)[0]
+        return render_post(post, self.reader)
+
+    def test_not_cached_without_a_shared_cache(self):
+        with override_settings(SHARED_CACHE=False):
+            self.render_ticket()
+            # Edited by another process, whose version bump would not reach this one
+            Ticket.objects.filter(pk=self.ticket.pk).update(title="Edited ticket")
+            self.assertIn("Edited ticket", self.render_ticket())
+
+    @override_settings(SHARED_CACHE=True)
+    def test_cached_with_a_shared_cache(self):
+        self.render_ticket()
+        Ticket.objects.filter(pk=self.ticket.pk).update(title="Edited ticket")
+        self.assertNotIn("Edited ticket", self.render_ticket())
+        bump_post_version(TICKET, self.ticket.pk)
+        self.assertIn("Edited ticket", self.render_ticket())
+
+
+def make_image(color='#8e44ad'):
+    buffer = BytesIO()
+    Image.new('RGB', (40, 60), color).save(buffer, 'PNG')
+    return ContentFile(buffer.getvalue(), name='cover.png')
+
+
+class MediaFileTests(TestCase):
+    """
+    Check that the images shared by identical uploads are only deleted once nothing may reference them.
+    """
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = CustomUser.objects.create_user(username='author', password='password')
+
+    def age(self, name, seconds=2 * 24 * 60 * 60):
+        modified = time.time() - seconds
+        os.utime(ticket_image_storage.path(name), (modified, modified))
+
+    def test_release_keeps_a_recently_stored_image(self):
+        name = ticket_image_storage.save('tickets/cover.png', make_image())
+        self.assertFalse(release_image(name, ticket_image_storage))
+        self.assertTrue(ticket_image_storage.exists(name))
+
+    def test_release_deletes_an_old_unreferenced_image(self):
+        name = ticket_image_storage.save('tickets/cover.png', make_image())
+        self.age(name)
+        self.assertTrue(release_image(name, ticket_image_storage))
+        self.assertFalse(ticket_image_storage.exists(name))
+
+    def test_release_keeps_a_referenced_image(self):
+        name = ticket_image_storage.save('tickets/cover.png', make_image())
+        self.age(name)
+        Ticket.objects.create(user=self.user, title="Ticket", image=name)
+        self.assertFalse(release_image(name, ticket_image_storage))
+
+    def test_identical_upload_survives_the_release_of_its_file(self):
+        ticket = Ticket.objects.create(user=self.user, title="First", image=make_image())
+        name = ticket.image.name
+        self.age(name)
+        # A second upload of the same image is stored while the first ticket is being deleted
+        self.assertEqual(ticket_image_storage.save('tickets/cover.png', make_image()), name)
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket.delete()
+        self.assertTrue(ticket_image_storage.exists(name))
+
+    def test_collector_removes_only_old_orphans(self):
+        orphan = ticket_image_storage.save('tickets/cover.png', make_image('#2c3e50'))
+        recent = ticket_image_storage.save('tickets/cover.png', make_image('#c0392b'))
+        used = Ticket.objects.create(user=self.user, title="Ticket", image=make_image()).image.name
+        self.age(orphan)
+        self.age(used)
+        call_command('collect_orphaned_media', stdout=StringIO())
+        self.assertFalse(ticket_image_storage.exists(orphan))
+        self.assertTrue(ticket_image_storage.exists(recent))
+        self.assertTrue(ticket_image_storage.exists(used))
+
+    def test_orphan_claimed_after_the_scan_is_kept(self):
+        name = ticket_image_storage.save('tickets/cover.png', make_image())
+        self.age(name)
+        root = ticket_image_storage.location
+        file, = [file for file in iter_media_files(root, 'tickets') if file.name == name]
+        self.assertTrue(is_still_orphaned(root, file))
+        # An identical upload refreshes the file between the scan and the removal
+        ticket_image_storage.save('tickets/cover.png', make_image())
+        self.assertFalse(is_still_orphaned(root, file))
+
+
+class ReviewStatsTests(TestCase):
+    """
+    Check that the review aggregates of tickets follow the reviews edited in the admin and never go negative.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser(username='admin', password='password')
+        cls.author = CustomUser.objects.create_user(username='author', password='password')
+        cls.ticket = Ticket.objects.create(user=cls.author, title="Ticket")
+        cls.other_ticket = Ticket.objects.create(user=cls.author, title="Other ticket")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def assertStats(self, ticket, review_count, rating_sum):
+        ticket = Ticket.objects.get(pk=ticket.pk)
+        self.assertEqual((ticket.review_count, ticket.rating_sum), (review_count, rating_sum))
+
+    def review_data(self, ticket, rating):
+        return {'ticket': ticket.pk, 'user': self.author.pk, 'headline': "Review", 'rating': rating, 'body': ''}
+
+    def test_deleting_an_uncounted_review(self):
+        review = Review.objects.create(user=self.author, ticket=self.ticket, headline="Review", rating=4)
+        self.client.force_login(self.author)
+        response = self.client.post(reverse('review-delete', args=[review.pk]))
+        self.assertEqual(response.status_code, 302)
+        self.assertStats(self.ticket, 0, 0)
+
+    def test_admin_add_change_and_delete(self):
+        self.client.post(reverse('admin:feed_review_add'), self.review_data(self.ticket, 4))
+        self.assertStats(self.ticket, 1, 4)
+        review = Review.objects.get()
+
+        self.client.post(reverse('admin:feed_review_change', args=[review.pk]), self.review_data(self.ticket, 2))
+        self.assertStats(self.ticket, 1, 2)
+
+        self.client.post(reverse('admin:feed_review_change', args=[review.pk]), self.review_data(self.other_ticket, 5))
+        self.assertStats(self.ticket, 0, 0)
+        self.assertStats(self.other_ticket, 1, 5)
+
+        self.client.post(reverse('admin:feed_review_delete', args=[review.pk]), {'post': 'yes'})
+        self.assertStats(self.other_ticket, 0, 0)
+
+    def test_admin_bulk_delete(self):
+        for rating in (1, 2, 3):
+            self.client.post(reverse('admin:feed_review_add'), self.review_data(self.ticket, rating))
+        self.client.post(reverse('admin:feed_review_add'), self.review_data(self.other_ticket, 5))
+        self.client.post(reverse('admin:feed_review_changelist'), {
+            'action': 'delete_selected',
+            'post': 'yes',
+            '_selected_action': list(Review.objects.filter(ticket=self.ticket).values_list('pk', flat=True)[:2]),
+        })
+        self.assertEqual(Review.objects.count(), 2)
+        remaining = Review.objects.get(ticket=self.ticket)
+        self.assertStats(self.ticket, 1, remaining.rating)
+        self.assertStats(self.other_ticket, 1, 5)
+
+
+class TimelineMigrationTests(TestCase):
+    """
+    Check that the migration creating the timelines fills them like `rebuild_timelines`.
+    """
+    def test_fill_timelines(self):
+        author = CustomUser.objects.create_user(username='author', password='password')
+        reader = CustomUser.objects.create_user(username='reader', password='password')
+        UserFollows.objects.create(user=reader, followed_user=author)
+        ticket = Ticket.objects.create(user=author, title="Ticket")
+        review = Review.objects.create(user=reader, ticket=ticket, headline="Review", rating=3)
+        TimelineEntry.objects.all().delete()
+
+        migration = importlib.import_module('feed.migrations.0006_timelineentry_pulledauthor')
+        migration.fill_timelines(apps, connection.schema_editor())
+
+        entries = set(TimelineEntry.objects.values_list('owner_id', 'content_type', 'post_id'))
+        self.assertEqual(entries, {
+            (author.id, 'TICKET', ticket.id),
+            (reader.id, 'TICKET', ticket.id),
+            (reader.id, 'REVIEW', review.id),
+        })
+
+
+@override_settings(SHARED_CACHE=True)
+class ConditionalPageTests(TestCase):
+    """
+    Check that the feed and posts pages are revalidated with their ETag, which follows edits and deletions.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='author', password='password')
+        cls.ticket = Ticket.objects.create(user=cls.user, title="Ticket")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_no_last_modified(self):
+        for name in ('feed', 'posts'):
+            response = self.client.get(reverse(name))
+            self.assertIn('ETag', response.headers)
+            self.assertNotIn('Last-Modified', response.headers)
+
+    def test_unchanged_page_is_not_modified(self):
+        etag = self.client.get(reverse('posts')).headers['ETag']
+        self.assertEqual(self.client.get(reverse('posts'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_edit_changes_the_etag(self):
+        etag = self.client.get(reverse('posts')).headers['ETag']
+        self.client.post(reverse('ticket-update', args=[self.ticket.pk]), {'title': "Edited", 'description': ''})
+        response = self.client.get(reverse('posts'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Edited")
+
+    def test_new_post_changes_the_etag(self):
+        etag = self.client.get(reverse('api-feed')).headers['ETag']
+        self.assertEqual(self.client.get(reverse('api-feed'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Ticket.objects.create(user=self.user, title="New ticket")
+        self.assertEqual(self.client.get(reverse('api-feed'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_no_etag_without_a_shared_cache(self):
+        with override_settings(SHARED_CACHE=False):
+            for name in ('feed', 'posts', 'api-feed'):
+                self.assertNotIn('ETag', self.client.get(reverse(name)).headers)
+
+
+class RangeTests(TestCase):
+    """
+    Check the parsing of `Range` headers and the partial responses of the media view.
+    """
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=95-200', 100), (95, 99))
+        self.assertIsNone(parse_range(None, 100))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 100))
+
+    def test_inverted_range_is_ignored(self):
+        self.assertIsNone(parse_range('bytes=9-3', 100))
+
+    def test_range_past_the_end_is_unsatisfiable(self):
+        with self.assertRaises(UnsatisfiableRange):
+            parse_range('bytes=100-', 100)
+
+    def test_media_view(self):
+        with TemporaryDirectory() as directory, override_settings(MEDIA_ROOT=directory, MEDIA_SENDFILE_HEADER=''):
+            with open(os.path.join(directory, 'file.txt'), 'wb') as file:
+                file.write(b'0123456789')
+            url = reverse('media', args=['file.txt'])
+
+            response = self.client.get(url, HTTP_RANGE='bytes=2-4')
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(b''.join(response.streaming_content), b'234')
+
+            response = self.client.get(url, HTTP_RANGE='bytes=9-3')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+
+            self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=10-').status_code, 416)
+
+
+class StaticFilesTests(TestCase):
+    """
+    Check that the static files middleware sends the precompressed copies under the name of their asset.
+    """
+    def test_precompressed_copy(self):
+        with TemporaryDirectory() as directory, override_settings(STATIC_ROOT=directory, STATIC_URL='static/'):
+            path = os.path.join(directory, 'app.css')
+            with open(path, 'w') as file:
+                file.write('body { color: black; }\n' * 100)
+            compress_file(path)
+
+            middleware = StaticFilesMiddleware(lambda request: None)
+            request = RequestFactory().get('/static/app.css', HTTP_ACCEPT_ENCODING='gzip, deflate')
+            response = middleware(request)
+            response.close()
+
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Content-Type'], 'text/css')
+        self.assertNotIn('.gz', response.headers.get('Content-Disposition', ''))
+        self.assertIn('app.css', response.headers.get('Content-Disposition', ''))
+
+
+class RebuildTimelinesTests(TestCase):
+    """
+    Check that rebuilding some timelines leaves the feeds of the other users complete.
+    """
+    def test_partial_rebuild_keeps_the_pulled_authors(self):
+        star = CustomUser.objects.create_user(username='star', password='password')
+        followers = [CustomUser.objects.create_user(username=f'u{index}', password='password') for index in range(2)]
+        for follower in followers:
+            UserFollows.objects.create(user=follower, followed_user=star)
+        ticket = Ticket.objects.create(user=star, title="Ticket")
+
+        with override_settings(FEED_FANOUT_MAX_FOLLOWERS=1):
+            call_command('rebuild_timelines', stdout=StringIO())
+        # The threshold was raised, but only the timeline of u0 is rebuilt
+        with override_settings(FEED_FANOUT_MAX_FOLLOWERS=1000):
+            call_command('rebuild_timelines', 'u0', stdout=StringIO())
+
+        for follower in followers:
+            rows, _ = get_timeline_rows(follower.id, [star.id])
+            self.assertIn((TICKET, ticket.id), [(content_type, pk) for content_type, pk, _ in rows])
+
+
+class AsyncTimelineTests(TestCase):
+    """
+    Check that the asynchronous feed pulls the posts of the followed users it is given.
+    """
+    async def test_async_page_merges_the_given_pulled_authors(self):
+        star = await CustomUser.objects.acreate(username='star')
+        reader = await CustomUser.objects.acreate(username='reader')
+        await UserFollows.objects.acreate(user=reader, followed_user=star)
+        ticket = await Ticket.objects.acreate(user=star, title="Ticket")
+        with override_settings(FEED_FANOUT_MAX_FOLLOWERS=0):
+            await sync_to_async(call_command)('rebuild_timelines', stdout=StringIO())
+
+        page = await aget_timeline_page(reader.id, [star.id])
+        self.assertEqual([post.id for post in page.posts], [ticket.id])
+        page = await aget_timeline_page(reader.id, [])
+        self.assertEqual(page.posts, [])
@@ -0,0 +1,316 @@
+import asyncio
+from heapq import merge
+from itertools import groupby
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from feed.models import REVIEW
+from feed.models import TICKET
+from feed.models import PulledAuthor
+from feed.models import Review
+from feed.models import Ticket
+from feed.models import TimelineEntry
+from feed.pagination import FeedPage
+from feed.pagination import aload_posts
+from feed.pagination import decode_cursor
+from feed.pagination import filter_before
+from feed.pagination import load_posts
+from feed.pagination import merged_posts_query
+from feed.pagination import paginate_rows
+from users.models import UserFollows
+
+BATCH_SIZE = 1000
+
+
+def get_content_type(post):
+    """
+    Return the content type (`TICKET` or `REVIEW`) of a post instance.
+    """
+    return TICKET if isinstance(post, Ticket) else REVIEW
+
+
+def iter_author_posts(author_ids, batch_size=BATCH_SIZE):
+    """
+    Yield `(content_type, id, author_id, time_create)` for every post of `author_ids`.
+
+    Rows are streamed from the database in chunks so that large histories are never held in memory.
+    """
+    for content_type, model in ((TICKET, Ticket), (REVIEW, Review)):
+        rows = model.objects.filter(user_id__in=author_ids).values_list('id', 'user_id', 'time_create')
+        for pk, author_id, time_create in rows.iterator(chunk_size=batch_size):
+            yield content_type, pk, author_id, time_create
+
+
+def write_entries(entries, batch_size=BATCH_SIZE):
+    """
+    Insert timeline entries in batches, ignoring the ones that already exist.
+
+    Parameters:
+    entries: iterable of TimelineEntry
+        Unsaved entries; the iterable is consumed lazily, one batch at a time.
+    """
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def is_pulled_author(user_id):
+    """
+    Tell whether the posts of an author are pulled on read instead of being fanned out.
+    """
+    return PulledAuthor.objects.filter(user_id=user_id).exists()
+
+
+def get_fanout_followers(author_id):
+    """
+    Get the followers a new post of `author_id` should be fanned out to.
+
+    Authors with more than `FEED_FANOUT_MAX_FOLLOWERS` followers are switched to pull-on-read,
+    in which case an empty list is returned.
+
+    Returns:
+    List of Integers
+        IDs of the followers of the author.
+    """
+    if is_pulled_author(author_id):
+        return []
+
+    max_followers = settings.FEED_FANOUT_MAX_FOLLOWERS
+    followers = UserFollows.objects.filter(followed_user_id=author_id).values_list('user_id', flat=True)
+    follower_ids = list(followers[:max_followers + 1])
+    if len(follower_ids) > max_followers:
+        PulledAuthor.objects.get_or_create(user_id=author_id)
+        return []
+    return follower_ids
+
+
+def fan_out_post(post):
+    """
+    Write a newly created ticket or review into the timeline of its author and their followers.
+    """
+    content_type = get_content_type(post)
+    owner_ids = [post.user_id] + get_fanout_followers(post.user_id)
+    write_entries(
+        TimelineEntry(owner_id=owner_id,
+                      author_id=post.user_id,
+                      content_type=content_type,
+                      post_id=post.id,
+                      time_create=post.time_create)
+        for owner_id in owner_ids
+    )
+
+
+def remove_post(content_type, post_id):
+    """
+    Remove a deleted ticket or review from every timeline.
+    """
+    TimelineEntry.objects.filter(content_type=content_type, post_id=post_id).delete()
+
+
+def backfill_timeline(user_id, *followed_user_ids):
+    """
+    Copy the existing posts of newly followed users into the timeline of the follower.
+
+    Nothing is copied for pulled authors, whose posts are read from their own tables.
+    """
+    pulled_ids = set(PulledAuthor.objects.filter(user_id__in=followed_user_ids).values_list('user_id', flat=True))
+    author_ids = [author_id for author_id in followed_user_ids if author_id not in pulled_ids]
+    if not author_ids:
+        return
+
+    write_entries(
+        TimelineEntry(owner_id=user_id,
+                      author_id=author_id,
+                      content_type=content_type,
+                      post_id=pk,
+                      time_create=time_create)
+        for content_type, pk, author_id, time_create in iter_author_posts(author_ids)
+    )
+
+
+def trim_timeline(user_id, *unfollowed_user_ids):
+    """
+    Remove the posts of unfollowed users from the timeline of the former follower.
+    """
+    TimelineEntry.objects.filter(owner_id=user_id, author_id__in=unfollowed_user_ids).delete()
+
+
+def refresh_pulled_authors():
+    """
+    Recompute the set of authors whose number of followers is above `FEED_FANOUT_MAX_FOLLOWERS`.
+    """
+    max_followers = settings.FEED_FANOUT_MAX_FOLLOWERS
+    pulled_ids = set(
+        UserFollows.objects.values('followed_user_id')
+        .annotate(follower_count=Count('id'))
+        .filter(follower_count__gt=max_followers)
+        .values_list('followed_user_id', flat=True)
+    )
+
+    with transaction.atomic():
+        PulledAuthor.objects.exclude(user_id__in=pulled_ids).delete()
+        PulledAuthor.objects.bulk_create([PulledAuthor(user_id=user_id) for user_id in pulled_ids],
+                                         ignore_conflicts=True)
+    return pulled_ids
+
+
+def rebuild_timeline(user_id, pulled_ids, batch_size=BATCH_SIZE):
+    """
+    Rebuild the timeline of one user from scratch.
+
+    Parameters:
+    user_id: int
+        The owner of the timeline.
+    pulled_ids: set of Integers
+        Authors whose posts must not be materialized, as returned by `refresh_pulled_authors`.
+    batch_size: int
+        Number of rows read and inserted per query.
+
+    Returns:
+    int
+        The number of authors whose posts were materialized.
+    """
+    followed_ids = UserFollows.objects.filter(user_id=user_id).values_list('followed_user_id', flat=True)
+    author_ids = [author_id for author_id in followed_ids if author_id not in pulled_ids]
+    author_ids.append(user_id)
+
+    with transaction.atomic():
+        TimelineEntry.objects.filter(owner_id=user_id).delete()
+        write_entries(
+            (TimelineEntry(owner_id=user_id,
+                           author_id=author_id,
+                           content_type=content_type,
+                           post_id=pk,
+                           time_create=time_create)
+             for content_type, pk, author_id, time_create in iter_author_posts(author_ids, batch_size)),
+            batch_size
+        )
+    return len(author_ids)
+
+
+def timeline_rows_query(user_id, position=None):
+    """
+    Build the query reading the `(content_type, post_id, time_create)` rows of a timeline, newest first.
+    """
+    entries = TimelineEntry.objects.filter(owner_id=user_id)
+    if position is not None:
+        entries = filter_before(entries, position, pk_field='post_id')
+    return entries.order_by('-time_create', '-post_id').values_list('content_type', 'post_id', 'time_create')
+
+
+def merge_rows(rows, pulled_rows):
+    """
+    Merge timeline rows with the rows of pulled authors, dropping the posts present in both.
+    """
+    rows = list({(content_type, pk): (content_type, pk, time_create)
+                 for content_type, pk, time_create in [*rows, *pulled_rows]}.values())
+    rows.sort(key=lambda row: (row[2], row[1]), reverse=True)
+    return rows
+
+
+def get_timeline_rows(user_id, followed_ids, cursor=None, page_size=20):
+    """
+    Fetch the `(content_type, post_id, time_create)` rows of one page of the feed of a user.
+
+    Posts of followed pulled authors are read from `Ticket` and `Review` with the same keyset
+    and merged with the timeline rows, so a page still costs a constant number of queries.
+
+    Parameters:
+    user_id: int
+        The owner of the feed.
+    followed_ids: iterable of Integers
+        IDs of the users followed by the owner.
+    cursor: str, optional
+        Cursor returned with the previous page; None for the newest posts.
+    page_size: int
+        Number of posts per page.
+
+    Returns:
+    tuple (list, str or None)
+        The rows of the page and the cursor of the next page.
+    """
+    position = decode_cursor(cursor) if cursor else None
+    rows = list(timeline_rows_query(user_id, position)[:page_size + 1])
+
+    pulled_ids = list(PulledAuthor.objects.filter(user_id__in=followed_ids).values_list('user_id', flat=True))
+    if pulled_ids:
+        rows = merge_rows(rows, merged_posts_query(pulled_ids, position)[:page_size + 1])
+
+    return paginate_rows(rows, page_size)
+
+
+def get_timeline_page(user_id, followed_ids, cursor=None, page_size=20):
+    """
+    Fetch one page of the feed of a user from their materialized timeline.
+
+    See `get_timeline_rows` for the parameters.
+
+    Returns:
+    FeedPage
+    """
+    rows, next_cursor = get_timeline_rows(user_id, followed_ids, cursor, page_size)
+    return FeedPage(load_posts(rows, viewer_id=user_id), next_cursor)
+
+
+async def aget_timeline_page(user_id, followed_ids, cursor=None, page_size=20):
+    """
+    Asynchronous version of `get_timeline_page`.
+
+    The timeline rows and the followed pulled authors do not depend on each other and are
+    fetched concurrently, as are the tickets and reviews of the page.
+    """
+    async def fetch(queryset):
+        return [row async for row in queryset]
+
+    position = decode_cursor(cursor) if cursor else None
+    pulled_authors = PulledAuthor.objects.filter(user_id__in=followed_ids).values_list('user_id', flat=True)
+    rows, pulled_ids = await asyncio.gather(fetch(timeline_rows_query(user_id, position)[:page_size + 1]),
+                                            fetch(pulled_authors))
+    if pulled_ids:
+        rows = merge_rows(rows, await fetch(merged_posts_query(pulled_ids, position)[:page_size + 1]))
+
+    rows, next_cursor = paginate_rows(rows, page_size)
+    return FeedPage(await aload_posts(rows, viewer_id=user_id), next_cursor)
+
+
+def iter_timeline(user_id, followed_ids, chunk_size=100):
+    """
+    Iterate over the whole feed of a user, newest first, one chunk of posts at a time.
+
+    Keys are read through server-side cursors over the timeline and the posts of followed pulled
+    authors, merged on the fly, and only `chunk_size` posts are instantiated at once, so memory
+    stays bounded whatever the length of the feed.
+
+    Parameters:
+    user_id: int
+        The owner of the feed.
+    followed_ids: iterable of Integers
+        IDs of the users followed by the owner.
+    chunk_size: int
+        Number of posts loaded per query.
+
+    Yields:
+    list
+        Ticket and Review instances annotated like the ones of `get_timeline_page`.
+    """
+    streams = [timeline_rows_query(user_id).iterator(chunk_size=chunk_size)]
+
+    pulled_ids = list(PulledAuthor.objects.filter(user_id__in=followed_ids).values_list('user_id', flat=True))
+    if pulled_ids:
+        streams.append(merged_posts_query(pulled_ids).iterator(chunk_size=chunk_size))
+
+    # Merge the sorted streams; a post present in both comes out twice in a row and is kept once
+    rows = merge(*streams, key=lambda row: (row[2], row[1]), reverse=True)
+    rows = (row for row, _ in groupby(rows))
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield load_posts(chunk, viewer_id=user_id)
@@ -1,96 +1,271 @@
+import asyncio
+import mimetypes
+import os
+import stat
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.exceptions import BadRequest
 from django.core.exceptions import PermissionDenied
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
 from django.urls import reverse_lazy
+from django.http import FileResponse
+from django.http import Http404
+from django.http import HttpResponse
+from django.http import JsonResponse
+from django.http import StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
+from django.template.loader import render_to_string
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+from django.utils.http import quote_etag
 from django.views.generic import View
 from django.views.generic.edit import FormView, CreateView
 from django.views.generic.edit import UpdateView
 from django.views.generic.edit import DeleteView
-from django.db.models import CharField
-from django.db.models import Value
-from itertools import chain
 from feed.forms import TicketForm
+from feed.fragments import feed_version_key
+from feed.fragments import get_versions
+from feed.fragments import log_stats as log_fragment_stats
+from feed.fragments import render_post
+from feed.freshness import conditional_page
+from feed.freshness import get_authors_etag
+from feed.freshness import get_feed_etag
+from feed.freshness import get_request_parts
+from feed.images import generate_ticket_variants
+from feed.media import UnsatisfiableRange
+from feed.media import get_sendfile_headers
+from feed.media import iter_file_range
+from feed.media import parse_range
 from feed.forms import ReviewForm
 from feed.models import Ticket
 from feed.models import Review
+from feed.pagination import InvalidCursor
+from feed.replicas import ReplicaReadMixin
+from feed.review_stats import add_review
+from feed.review_stats import change_review_rating
+from feed.review_stats import remove_review
+from feed.search import is_search_available
+from feed.search import search_posts
+from feed.serializers import serialize_posts
+from users.follow_graph import get_followed_ids
+from users.mixins import AsyncLoginRequiredMixin
+from feed.timeline import aget_timeline_page
+from feed.timeline import fan_out_post
+from feed.timeline import get_timeline_page
+from feed.timeline import get_timeline_rows
+from feed.timeline import iter_timeline
+
+
+def feed_page_etag(request, *args, **kwargs):
+    """
+    Compute the ETag of a page of the HTML feed.
 
+    Besides the posts of the user and of the users they follow, the page depends on the
+    version of the feed, bumped when the follow graph changes, and on the requested cursor.
+    """
+    key = feed_version_key(request.user.id)
+    return get_authors_etag([request.user.id, *FeedView.get_followed_user_ids(request.user)],
+                            *get_request_parts(request),
+                            get_versions([key])[key],
+                            request.GET.get('cursor', ''))
 
-class FeedView(LoginRequiredMixin, View):
+
+def posts_page_etag(request, *args, **kwargs):
+    """
+    Compute the ETag of the posts page, which only lists the user's own posts.
+    """
+    return get_authors_etag([request.user.id], *get_request_parts(request))
+
+
+class FeedView(LoginRequiredMixin, ReplicaReadMixin, View):
     """
     View that aggregates and renders content for a user's feed.
 
     `FeedView` compiles and displays both `Review` and `Ticket` instances on a user’s feed.
-    This involves retrieving the posts from users followed by the logged-in user. Both ticket
-    and review instances are annotated with a content type to differentiate them in the template.
-    They are then ordered by creation time and presented to the user.
+    The posts of the logged-in user and of the users they follow are read from the user's
+    materialized timeline, merged with the posts of followed authors served by pull-on-read.
+    Both ticket and review instances are annotated with a content type to differentiate them
+    in the template. Only one page of posts, ordered by creation time, is fetched at a time;
+    the next page is reached through the cursor carried by the "load more" link.
     """
-    def get_reviewed_ticket_ids(self, user):
+    paginate_by = 20
+
+    @staticmethod
+    def get_followed_user_ids(user):
         """
-        Get the IDs of tickets reviewed by a particular user.
+        Gather the IDs of the users followed by the specified user, from the cached follow graph.
 
         Parameters:
         user: User object
-            The user whose reviewed ticket IDs are being retrieved.
+            The user for whom the feed is being built.
 
         Returns:
-        QuerySet of Integers
-            IDs of tickets that have been reviewed by the user.
+        List of Integers
+            IDs of the users followed by the specified user.
         """
-        return Review.objects.filter(user=user).values_list('ticket_id', flat=True)
+        return list(get_followed_ids(user.id))
 
-    def get_users_viewable_reviews(self, user):
-        """
-        Gather reviews made by users that the specified user follows.
+    @conditional_page(feed_page_etag)
+    def get(self, request, *args, **kwargs):
+        # Retrieve the requested page of posts (reviews and tickets) visible to the user
+        try:
+            page = get_timeline_page(request.user.id,
+                                     self.get_followed_user_ids(request.user),
+                                     cursor=request.GET.get('cursor'),
+                                     page_size=self.paginate_by)
+        except InvalidCursor:
+            raise BadRequest("Invalid feed cursor.")
+
+        # Render the content on the user's feed, reusing the cached post fragments
+        response = render(request,
+                          'feed/feed.html',
+                          context={'posts': page.posts, 'next_cursor': page.next_cursor})
+        log_fragment_stats()
+        return response
+
+
+class AsyncFeedView(AsyncLoginRequiredMixin, FeedView):
+    """
+    Asynchronous version of `FeedView`, used when the project is served over ASGI.
 
-        Parameters:
-        user: User object
-            The user for whom viewable reviews are being retrieved.
+    The independent queries of the page (timeline rows and followed pulled authors, then
+    tickets and reviews) are issued concurrently through the async ORM interface.
+    """
+    async def get(self, request, *args, **kwargs):
+        # Retrieve the requested page of posts (reviews and tickets) visible to the user
+        try:
+            followed_ids = await sync_to_async(self.get_followed_user_ids)(request.user)
+            page = await aget_timeline_page(request.user.id,
+                                            followed_ids,
+                                            cursor=request.GET.get('cursor'),
+                                            page_size=self.paginate_by)
+        except InvalidCursor:
+            raise BadRequest("Invalid feed cursor.")
+
+        # Render the content on the user's feed, outside of the event loop
+        response = await sync_to_async(render)(request,
+                                               'feed/feed.html',
+                                               context={'posts': page.posts, 'next_cursor': page.next_cursor})
+        log_fragment_stats()
+        return response
+
+
+class FeedStreamView(FeedView):
+    """
+    View that streams the whole feed of a user instead of a single page.
 
-        Returns:
-        QuerySet of Review objects
-            Reviews created by users that are followed by the specified user.
-        """
-        followed_users = list(user.following.values_list('followed_user', flat=True))
-        followed_users.append(user.id)
-        return Review.objects.filter(user_id__in=followed_users)
+    `FeedStreamView` sends the page header from `feed/base.html` as soon as it is rendered,
+    then the post fragments as they are read from the database through server-side cursors,
+    and the footer last. Only a chunk of posts is held in memory at a time, and the first
+    bytes reach the browser before the rest of the feed is even queried.
+    """
+    template_name = 'feed/feed.html'
+    placeholder = '<!-- feed:posts -->'
+    chunk_size = 50
 
-    def get_users_viewable_tickets(self, user):
+    def stream_posts(self, request, head, tail):
         """
-        Gather tickets made by users that the specified user follows.
+        Yield the header, the rendered posts of the feed, then the footer of the page.
+        """
+        yield head
 
-        Parameters:
-        user: User object
-            The user for whom viewable tickets are being retrieved.
+        has_posts = False
+        for posts in iter_timeline(request.user.id,
+                                   self.get_followed_user_ids(request.user),
+                                   chunk_size=self.chunk_size):
+            for post in posts:
+                has_posts = True
+                yield render_post(post, request.user)
 
-        Returns:
-        QuerySet of Ticket objects
-            Tickets created by users that are followed by the specified user.
-        """
-        followed_users = list(user.following.values_list('followed_user', flat=True))
-        followed_users.append(user.id)
-        return Ticket.objects.filter(user_id__in=followed_users)
+        if not has_posts:
+            yield render_to_string('snippets/no_posts.html')
+        yield tail
+        log_fragment_stats()
 
     def get(self, request, *args, **kwargs):
-        # Retrieve and annotate reviews and tickets visible to the user
-        reviews = self.get_users_viewable_reviews(request.user)
-        reviews = reviews.annotate(content_type=Value('REVIEW', CharField()))
-        tickets = self.get_users_viewable_tickets(request.user)
-        tickets = tickets.annotate(content_type=Value('TICKET', CharField()))
-
-        # Get IDs of tickets reviewed by the user
-        reviewed_ticket_ids = self.get_reviewed_ticket_ids(request.user)
-
-        # Merge and sort the posts (reviews and tickets)
-        posts = sorted(
-            chain(reviews, tickets),
-            key=lambda post: post.time_create,
-            reverse=True
-        )
+        # Render the page around a placeholder, split where the posts will be streamed
+        page = render_to_string(self.template_name, {'streaming': True}, request=request)
+        head, tail = page.split(self.placeholder, 1)
+        return StreamingHttpResponse(self.stream_posts(request, head, tail))
+
+
+def feed_api_etag(request, *args, **kwargs):
+    """
+    Compute the ETag of a page of the JSON feed, see `feed.freshness.get_feed_etag`.
+    """
+    return get_feed_etag(request.user.id,
+                         FeedView.get_followed_user_ids(request.user),
+                         request.GET.get('cursor', ''),
+                         FeedAPIView.paginate_by)
+
+
+class FeedAPIView(FeedView):
+    """
+    View that returns one page of a user's feed as JSON.
+
+    `FeedAPIView` exposes the same merged stream of tickets and reviews as `FeedView`, for
+    scripts and mobile clients. Posts are serialized from the selected columns only, and the
+    page is paginated with the same cursors. With a shared cache, responses carry a strong ETag
+    computed from the version counters of the authors, so that a client revalidating an unchanged
+    page gets a `304 Not Modified` before any post is read or serialized.
+    """
+    raise_exception = True
+
+    @conditional_page(feed_api_etag)
+    def get(self, request, *args, **kwargs):
+        # Retrieve the keys of the requested page of posts visible to the user
+        try:
+            rows, next_cursor = get_timeline_rows(request.user.id,
+                                                  self.get_followed_user_ids(request.user),
+                                                  cursor=request.GET.get('cursor'),
+                                                  page_size=self.paginate_by)
+        except InvalidCursor:
+            raise BadRequest("Invalid feed cursor.")
+
+        # Serialize the posts without instantiating the models
+        return JsonResponse({'posts': serialize_posts(rows, request.user.id), 'next_cursor': next_cursor},
+                            json_dumps_params={'separators': (',', ':')})
+
+
+class SearchView(FeedView):
+    """
+    View searching the tickets and reviews visible in a user's feed.
+
+    `SearchView` looks the words of the `q` parameter up in the full-text index of titles,
+    descriptions, headlines and review bodies, restricted to the posts of the user and of the
+    users they follow, like the feed. Results are ranked by relevance, displayed with the
+    highlighted excerpts that matched, and paginated with the `page` parameter.
+    """
+    template_name = 'feed/search.html'
+
+    def get(self, request, *args, **kwargs):
+        query = request.GET.get('q', '').strip()
+        try:
+            page = int(request.GET.get('page', 1))
+        except ValueError:
+            raise BadRequest("Invalid page number.")
+        if page < 1:
+            raise BadRequest("Invalid page number.")
+
+        # Search the posts of the user and of the users they follow
+        results, has_next = [], False
+        available = is_search_available()
+        if query and available:
+            results, has_next = search_posts(query,
+                                             [request.user.id, *self.get_followed_user_ids(request.user)],
+                                             viewer_id=request.user.id,
+                                             page=page,
+                                             page_size=self.paginate_by)
 
-        # Render the content on the user's feed
         return render(request,
-                      'feed/feed.html',
-                      context={'posts': posts, 'reviewed_ticket_ids': reviewed_ticket_ids})
+                      self.template_name,
+                      {'query': query, 'results': results, 'page': page, 'has_next': has_next,
+                       'available': available})
 
 
 class TicketCreateView(LoginRequiredMixin, FormView):
@@ -113,8 +288,12 @@ class TicketCreateView(LoginRequiredMixin, FormView):
         # Associate the current user as the ticket's creator
         ticket.user = self.request.user
 
-        # Finalize saving the ticket instance to the database
+        # Finalize saving the ticket instance to the database and resize its image
         ticket.save()
+        generate_ticket_variants(ticket)
+
+        # Publish the ticket to the timelines of the user and their followers
+        fan_out_post(ticket)
 
         # Redirect to the success URL
         return super().form_valid(form)
@@ -145,7 +324,12 @@ class TicketUpdateView(LoginRequiredMixin, UpdateView):
 
     def form_valid(self, form):
         # Save the form and redirect to the success URL
-        return super().form_valid(form)
+        response = super().form_valid(form)
+
+        # Resize the new image if one was uploaded
+        if 'image' in form.changed_data:
+            generate_ticket_variants(self.object)
+        return response
 
 
 class TicketDeleteView(LoginRequiredMixin, DeleteView):
@@ -205,8 +389,10 @@ class CreateTicketAndReviewView(LoginRequiredMixin, FormView):
         # Assign the current user to the new ticket instance
         ticket.user = self.request.user
 
-        # Save the ticket instance
+        # Save the ticket instance, resize its image and publish it to the timelines
         ticket.save()
+        generate_ticket_variants(ticket)
+        fan_out_post(ticket)
 
         # Manually validate the second form
         form2 = self.second_form_class(self.request.POST)
@@ -221,8 +407,11 @@ class CreateTicketAndReviewView(LoginRequiredMixin, FormView):
             review.ticket = ticket
             review.user = self.request.user
 
-            # Save the review instance
-            review.save()
+            # Save the review instance, count it in the ticket's aggregates and publish it to the timelines
+            with transaction.atomic():
+                review.save()
+                add_review(review)
+            fan_out_post(review)
 
             # Redirect to the success URL
             return super().form_valid(form)
@@ -231,7 +420,7 @@ class CreateTicketAndReviewView(LoginRequiredMixin, FormView):
             return self.form_invalid(form)
 
 
-class PostView(LoginRequiredMixin, View):
+class PostView(LoginRequiredMixin, ReplicaReadMixin, View):
     """
     View to display user's tickets and reviews in the 'posts' page.
 
@@ -241,17 +430,38 @@ class PostView(LoginRequiredMixin, View):
     """
     template_name = "feed/posts.html"
 
+    @conditional_page(posts_page_etag)
     def get(self, request):
         # Retrieve tickets created by the user, ordered by creation time
         user_tickets = Ticket.objects.filter(user=request.user).order_by('-time_create')
 
-        # Retrieve reviews created by the user, ordered by creation time
-        user_reviews = Review.objects.filter(user=request.user).order_by('-time_create')
+        # Retrieve reviews created by the user along with their tickets, ordered by creation time
+        user_reviews = Review.objects.filter(user=request.user).select_related('ticket').order_by('-time_create')
 
         # Render the page with the fetched tickets and reviews
         return render(request, self.template_name, {"user_tickets": user_tickets, "user_reviews": user_reviews})
 
 
+class AsyncPostView(AsyncLoginRequiredMixin, PostView):
+    """
+    Asynchronous version of `PostView`, fetching the user's tickets and reviews concurrently.
+    """
+    async def get(self, request):
+        async def fetch(queryset):
+            return [post async for post in queryset]
+
+        # Retrieve the tickets and the reviews (with their tickets) created by the user at the same time
+        user_tickets, user_reviews = await asyncio.gather(
+            fetch(Ticket.objects.filter(user=request.user).order_by('-time_create')),
+            fetch(Review.objects.filter(user=request.user).select_related('ticket').order_by('-time_create')),
+        )
+
+        # Render the page with the fetched tickets and reviews, outside of the event loop
+        return await sync_to_async(render)(request,
+                                           self.template_name,
+                                           {"user_tickets": user_tickets, "user_reviews": user_reviews})
+
+
 class ReviewCreateView(LoginRequiredMixin, CreateView):
     """
     View for creating a new review.
@@ -279,8 +489,14 @@ class ReviewCreateView(LoginRequiredMixin, CreateView):
         form.instance.user = self.request.user
         form.instance.ticket = get_object_or_404(Ticket, pk=self.kwargs.get('ticket_id'))
 
-        # Proceed to default form_valid behavior (save and redirect)
-        return super().form_valid(form)
+        # Proceed to default form_valid behavior (save and redirect), counting the review in the ticket's aggregates
+        with transaction.atomic():
+            response = super().form_valid(form)
+            add_review(self.object)
+
+        # Publish the review to the timelines of the user and their followers
+        fan_out_post(self.object)
+        return response
 
 
 class ReviewUpdateView(LoginRequiredMixin, UpdateView):
@@ -308,8 +524,11 @@ class ReviewUpdateView(LoginRequiredMixin, UpdateView):
     def form_valid(self, form):
         # Assign the requesting user to the form instance user
         form.instance.user = self.request.user
-        # Proceed to default form_valid behavior (save and redirect)
-        return super().form_valid(form)
+        # Proceed to default form_valid behavior (save and redirect), updating the ticket's aggregates
+        with transaction.atomic():
+            response = super().form_valid(form)
+            change_review_rating(self.object, form.initial['rating'])
+        return response
 
     def get_context_data(self):
         # Get default context data
@@ -343,3 +562,78 @@ class ReviewDeleteView(LoginRequiredMixin, DeleteView):
         if review.user != self.request.user:
             raise PermissionDenied("You do not have permission to delete this review")
         return review
+
+    def form_valid(self, form):
+        # Delete the review and remove it from the ticket's aggregates
+        review = self.object
+        with transaction.atomic():
+            response = super().form_valid(form)
+            remove_review(review)
+        return response
+
+
+class MediaView(View):
+    """
+    View serving the uploaded files of `MEDIA_ROOT`, such as ticket images.
+
+    Whole files are sent with `FileResponse`, which lets the WSGI server copy them to the socket
+    with `sendfile` instead of reading them in Python. Single byte ranges are supported, and
+    clients revalidating a file they already have get a `304 Not Modified`. When
+    `MEDIA_SENDFILE_HEADER` is set, the response only tells the front web server (nginx with
+    `X-Accel-Redirect`, Apache with `X-Sendfile`) which file to send.
+    """
+    def get(self, request, path):
+        # Resolve the file, refusing paths escaping the media directory
+        try:
+            full_path = safe_join(settings.MEDIA_ROOT, path)
+            file_stat = os.stat(full_path)
+        except (SuspiciousFileOperation, OSError):
+            raise Http404("File not found.")
+        if not stat.S_ISREG(file_stat.st_mode):
+            raise Http404("File not found.")
+
+        # Answer conditional requests from the modification time and size of the file
+        last_modified = int(file_stat.st_mtime)
+        etag = quote_etag(f"{last_modified:x}-{file_stat.st_size:x}")
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = self.send_file(request, path, full_path, file_stat.st_size, etag, last_modified)
+
+        response.headers['ETag'] = etag
+        response.headers['Last-Modified'] = http_date(last_modified)
+        response.headers['Accept-Ranges'] = 'bytes'
+        patch_cache_control(response, public=True, max_age=settings.MEDIA_CACHE_MAX_AGE)
+        return response
+
+    def send_file(self, request, name, path, size, etag, last_modified):
+        """
+        Build the response carrying the file, or the requested part of it.
+        """
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+        # Let the front web server send the file, it handles ranges itself
+        if settings.MEDIA_SENDFILE_HEADER:
+            return HttpResponse(content_type=content_type,
+                                headers=get_sendfile_headers(settings.MEDIA_SENDFILE_HEADER, name, path,
+                                                             settings.MEDIA_ACCEL_REDIRECT_PREFIX))
+
+        # Only send a part of the file if the client's copy is still current (If-Range)
+        range_header = request.headers.get('Range')
+        if_range = request.headers.get('If-Range')
+        if if_range and if_range not in (etag, http_date(last_modified)):
+            range_header = None
+        try:
+            byte_range = parse_range(range_header, size)
+        except UnsatisfiableRange:
+            response = HttpResponse(status=416)
+            response.headers['Content-Range'] = f"bytes */{size}"
+            return response
+
+        file = open(path, 'rb')
+        if byte_range is None:
+            return FileResponse(file, content_type=content_type)
+        start, end = byte_range
+        response = StreamingHttpResponse(iter_file_range(file, start, end), status=206, content_type=content_type)
+        response.headers['Content-Range'] = f"bytes {start}-{end}/{size}"
+        response.headers['Content-Length'] = str(end - start + 1)
+        return response
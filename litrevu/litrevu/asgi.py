@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "litrevu.settings")
+os.environ.setdefault("DJANGO_ASYNC_VIEWS", "True")
+# Persistent connections are not reused by the async views, whose queries run in changing threads
+os.environ.setdefault("DATABASE_CONN_MAX_AGE", "0")
 
 application = get_asgi_application()
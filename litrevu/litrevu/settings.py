@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 import os
 from pathlib import Path
+from decouple import Csv
 from decouple import config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -24,9 +25,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = config('DJANGO_SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = config('DJANGO_DEBUG', default=True, cast=bool)
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = config('DJANGO_ALLOWED_HOSTS', default="", cast=Csv())
 
 
 # Application definition
@@ -44,10 +45,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "feed.staticfiles.StaticFilesMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "feed.replicas.PrimaryPinningMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -72,18 +75,95 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "litrevu.wsgi.application"
 
+# Serve the feed, posts and subscriptions pages with their async views (enabled by asgi.py).
+ASYNC_VIEWS = config('DJANGO_ASYNC_VIEWS', default=False, cast=bool)
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# SQLite by default. Set DATABASE_ENGINE to "django.db.backends.postgresql" (with psycopg installed)
+# and the DATABASE_* credentials to use PostgreSQL; the full-text search is only available on SQLite.
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "ENGINE": config('DATABASE_ENGINE', default="django.db.backends.sqlite3"),
+        "NAME": config('DATABASE_NAME', default=str(BASE_DIR / "db.sqlite3")),
+        "USER": config('DATABASE_USER', default=""),
+        "PASSWORD": config('DATABASE_PASSWORD', default=""),
+        "HOST": config('DATABASE_HOST', default=""),
+        "PORT": config('DATABASE_PORT', default=""),
+        # Keep connections open between requests (in seconds, 0 to close them after each request,
+        # the default of asgi.py for the async views), and check that a reused connection still works.
+        "CONN_MAX_AGE": config('DATABASE_CONN_MAX_AGE', default=60, cast=int),
+        "CONN_HEALTH_CHECKS": config('DATABASE_CONN_HEALTH_CHECKS', default=True, cast=bool),
+        # Server-side cursors do not survive the transaction pooling of PgBouncer.
+        "DISABLE_SERVER_SIDE_CURSORS": config('DATABASE_PGBOUNCER', default=False, cast=bool),
+    }
+}
+
+# Read replica, used by the feed and listing pages (see feed.replicas). It shares the engine and
+# credentials of the primary; tests run it as a mirror of the default database.
+DATABASE_REPLICA_NAME = config('DATABASE_REPLICA_NAME', default="")
+if DATABASE_REPLICA_NAME:
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "NAME": DATABASE_REPLICA_NAME,
+        "HOST": config('DATABASE_REPLICA_HOST', default=DATABASES["default"]["HOST"]),
+        "PORT": config('DATABASE_REPLICA_PORT', default=DATABASES["default"]["PORT"]),
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["feed.replicas.ReplicaRouter"]
+# Time, in seconds, during which the reads of a user go to the primary after they wrote to it.
+DATABASE_REPLICA_PIN_SECONDS = config('DATABASE_REPLICA_PIN_SECONDS', default=10, cast=int)
+
+# Pragmas run on every new SQLite connection (see feed.apps); empty ones are skipped. Writers wait for the
+# lock for busy_timeout milliseconds instead of failing. Set SQLITE_JOURNAL_MODE to "wal" in production to let
+# readers work while a request writes: the mode is stored in the database file, so it is off by default to
+# leave the bundled db.sqlite3 untouched.
+SQLITE_JOURNAL_MODE = config('SQLITE_JOURNAL_MODE', default="")
+SQLITE_PRAGMAS = {
+    "journal_mode": SQLITE_JOURNAL_MODE,
+    # Safe with the write-ahead log, which is synced at checkpoints
+    "synchronous": config('SQLITE_SYNCHRONOUS', default="normal" if SQLITE_JOURNAL_MODE.lower() == "wal" else ""),
+    "mmap_size": config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),
+    "busy_timeout": config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int),
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": config('CACHE_BACKEND', default="django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": config('CACHE_LOCATION', default="litrevu"),
     }
 }
 
 
+# Sessions and authentication
+# https://docs.djangoproject.com/en/4.2/topics/http/sessions/#configuring-the-session-engine
+
+# The local memory cache is private to each server process: a session or user cached there would outlive
+# a logout, a password change or a deactivation handled by another process.
+SHARED_CACHE = CACHES["default"]["BACKEND"] not in (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+# With a shared cache (Memcached, Redis), sessions are read from the cache and written through to the
+# database ("cached_db"); otherwise they are read from the database.
+SESSION_ENGINE = config('DJANGO_SESSION_ENGINE', default="django.contrib.sessions.backends.cached_db" if SHARED_CACHE
+                        else "django.contrib.sessions.backends.db")
+
+# With a shared cache, the authenticated user is served from the cache too, see users.backends.
+AUTHENTICATION_BACKENDS = ["users.backends.CachedModelBackend" if SHARED_CACHE
+                           else "django.contrib.auth.backends.ModelBackend"]
+# Lifetime, in seconds, of the cached users.
+USER_CACHE_TIMEOUT = 60 * 60
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -119,6 +199,21 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
 STATIC_URL = "static/"
+# Destination of collectstatic, served by feed.staticfiles.StaticFilesMiddleware.
+STATIC_ROOT = config('DJANGO_STATIC_ROOT', default=str(BASE_DIR / "staticfiles"))
+
+# Outside of debug mode, collected static files get the hash of their content in their name and
+# are precompressed, see feed.staticfiles; collectstatic must then be run before starting the server.
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": config('DJANGO_STATICFILES_STORAGE',
+                          default="django.contrib.staticfiles.storage.StaticFilesStorage" if DEBUG
+                          else "feed.staticfiles.CompressedManifestStaticFilesStorage"),
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -133,3 +228,25 @@ LOGOUT_REDIRECT_URL = LOGIN_URL
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
+# Media files are served by feed.views.MediaView. Set DJANGO_MEDIA_SENDFILE to "X-Accel-Redirect" (nginx) or
+# "X-Sendfile" (Apache) to let the front web server send them; nginx must then map MEDIA_ACCEL_REDIRECT_PREFIX
+# to MEDIA_ROOT in an internal location.
+MEDIA_SENDFILE_HEADER = config('DJANGO_MEDIA_SENDFILE', default="")
+MEDIA_ACCEL_REDIRECT_PREFIX = config('DJANGO_MEDIA_ACCEL_PREFIX', default="/protected-media/")
+# Lifetime, in seconds, of the media files in browser and proxy caches.
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24
+
+# Widths, in pixels, of the resized variants generated for ticket images, and whether WebP copies are generated.
+TICKET_IMAGE_WIDTHS = (300, 600)
+TICKET_IMAGE_WEBP = True
+# Ticket images modified less than this number of seconds ago are not deleted with the ticket releasing them,
+# as an identical upload may be about to reference them; collect_orphaned_media removes them later.
+TICKET_IMAGE_RELEASE_GRACE = 60 * 60
+
+# Feed
+# Authors with more followers than this are not fanned out to timelines but pulled on read.
+FEED_FANOUT_MAX_FOLLOWERS = 1000
+# Lifetime, in seconds, of the rendered ticket and review fragments of the feed.
+FEED_FRAGMENT_CACHE_TIMEOUT = 60 * 60
+# Lifetime, in seconds, of the cached following and followers lists of each user (only cached with SHARED_CACHE).
+FOLLOW_GRAPH_CACHE_TIMEOUT = 60 * 60 * 24
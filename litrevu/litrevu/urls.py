@@ -14,18 +14,26 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
-from django.conf.urls.static import static
 
 from users.views import LoginView
 from users.views import SignupView
 from users.views import LogoutUserView
+from users.views import BulkFollowView
 from users.views import FollowUserView
+from users.views import AsyncFollowedUsersView
 from users.views import FollowedUsersView
 from users.views import UnfollowUserView
+from users.views import UsernameAutocompleteView
 
+from feed.views import AsyncFeedView
+from feed.views import AsyncPostView
+from feed.views import FeedAPIView
 from feed.views import FeedView
+from feed.views import FeedStreamView
+from feed.views import MediaView
 from feed.views import TicketCreateView
 from feed.views import TicketUpdateView
 from feed.views import TicketDeleteView
@@ -34,19 +42,29 @@ from feed.views import ReviewCreateView
 from feed.views import ReviewUpdateView
 from feed.views import ReviewDeleteView
 from feed.views import PostView
+from feed.views import SearchView
 
-from litrevu import settings
+# Serve the read-only pages with their asynchronous versions when running over ASGI.
+if settings.ASYNC_VIEWS:
+    feed_view, post_view, followed_users_view = AsyncFeedView, AsyncPostView, AsyncFollowedUsersView
+else:
+    feed_view, post_view, followed_users_view = FeedView, PostView, FollowedUsersView
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", LoginView.as_view(), name="login"),
     path("signup/", SignupView.as_view(), name="signup"),
     path("logout/", LogoutUserView.as_view(), name="logout"),
-    path("feed/", FeedView.as_view(), name="feed"),
-    path("posts/", PostView.as_view(), name="posts"),
+    path("feed/", feed_view.as_view(), name="feed"),
+    path("feed/stream/", FeedStreamView.as_view(), name="feed-stream"),
+    path("api/feed/", FeedAPIView.as_view(), name="api-feed"),
+    path("posts/", post_view.as_view(), name="posts"),
+    path("search/", SearchView.as_view(), name="search"),
     path('follow/', FollowUserView.as_view(), name='follow-user'),
+    path('follow/bulk/', BulkFollowView.as_view(), name='bulk-follow'),
+    path('users/autocomplete/', UsernameAutocompleteView.as_view(), name='username-autocomplete'),
     path('unfollow/<int:pk>/', UnfollowUserView.as_view(), name='unfollow-user'),
-    path('abonnements/', FollowedUsersView.as_view(), name='abonnements'),
+    path('abonnements/', followed_users_view.as_view(), name='abonnements'),
 
     path("tickets/create/", TicketCreateView.as_view(), name="ticket-create"),
     path("tickets/create/with-review/", CreateTicketAndReviewView.as_view(), name="ticket-review-create"),
@@ -55,7 +73,5 @@ urlpatterns = [
     path("reviews/create/<int:ticket_id>/", ReviewCreateView.as_view(), name="review-create"),
     path("reviews/<int:pk>/update/", ReviewUpdateView.as_view(), name="review-update"),
     path("reviews/<int:pk>/delete/", ReviewDeleteView.as_view(), name="review-delete"),
+    path(settings.MEDIA_URL.lstrip('/') + "<path:path>", MediaView.as_view(), name="media"),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,6 +1,55 @@
 from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin
+from django.db.models import Q
+from feed.pagination import EstimatedCountPaginator
+from users.forms import SignupForm
 from users.models import CustomUser
 from users.models import UserFollows
+from users.search import filter_username_prefix
 
-admin.site.register(CustomUser)
-admin.site.register(UserFollows)
+
+class CustomUserAdmin(UserAdmin):
+    """
+    Admin of the users, searched by the beginning of their username on its normalized index.
+
+    The filters of `UserAdmin` are left out: none of their columns is indexed.
+    """
+    add_form = SignupForm
+    list_display = ('username', 'email', 'is_staff', 'date_joined')
+    list_filter = ()
+    search_fields = ('username',)
+    search_help_text = "Beginning of the username, in any case."
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return filter_username_prefix(queryset, search_term), False
+
+
+class UserFollowsAdmin(admin.ModelAdmin):
+    """
+    Admin of the follows, searched by the beginning of the username of either user.
+    """
+    list_display = ('user', 'followed_user')
+    list_select_related = ('user', 'followed_user')
+    autocomplete_fields = ('user', 'followed_user')
+    search_fields = ('user__username', 'followed_user__username')
+    search_help_text = "Beginning of the username of the follower or of the followed user."
+    ordering = ('-id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        # Select the matching users first, so that both sides are looked up on their index
+        users = filter_username_prefix(CustomUser.objects.all(), search_term).values('id')
+        return queryset.filter(Q(user__in=users) | Q(followed_user__in=users)), False
+
+
+admin.site.register(CustomUser, CustomUserAdmin)
+admin.site.register(UserFollows, UserFollowsAdmin)
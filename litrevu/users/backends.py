@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from feed.replicas import read_from_primary
+
+
+def user_cache_key(user_id):
+    return f"users:user:{user_id}"
+
+
+def invalidate_cached_user(*user_ids):
+    """
+    Drop the cached copies of some users, e.g. after their profile or password changed.
+    """
+    cache.delete_many([user_cache_key(user_id) for user_id in user_ids])
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    Authenticate against the user model, serving the user of each request from the cache.
+
+    `AuthenticationMiddleware` loads the logged-in user on every request; with this backend
+    it is only read from the database on a cache miss. The entries are invalidated whenever a
+    user is saved or deleted, see `users.signals`, which covers password changes: the session
+    hash check of `django.contrib.auth.get_user` keeps working on the cached instance. Misses
+    are read from the primary database, even when the view reads from the replica.
+    """
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            with read_from_primary():
+                user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,142 @@
+import csv
+import re
+
+from django.db import transaction
+from feed.fragments import bump_feed_version
+from feed.timeline import BATCH_SIZE
+from feed.timeline import backfill_timeline
+from feed.timeline import trim_timeline
+from users.follow_graph import invalidate_follows
+from users.models import CustomUser
+from users.models import UserFollows
+
+FOLLOWED = 'followed'
+ALREADY_FOLLOWED = 'already_followed'
+UNFOLLOWED = 'unfollowed'
+NOT_FOLLOWED = 'not_followed'
+NOT_FOUND = 'not_found'
+SELF = 'self'
+
+USERNAME_SEPARATORS = re.compile(r'[\s,;]+')
+
+
+def unique(usernames):
+    """
+    Drop blank and repeated usernames, keeping the first occurrence of each.
+    """
+    return list(dict.fromkeys(username.strip() for username in usernames if username.strip()))
+
+
+def parse_usernames(text):
+    """
+    Split a list of usernames separated by commas, semicolons, spaces or new lines.
+    """
+    return unique(USERNAME_SEPARATORS.split(text))
+
+
+def read_usernames_csv(lines):
+    """
+    Read the usernames of the first column of a CSV file, skipping an optional `username` header.
+
+    Parameters:
+    lines: iterable of str
+        The lines of the file, e.g. an open text file.
+    """
+    usernames = [row[0] for row in csv.reader(lines) if row]
+    if usernames and usernames[0].strip().lower() == 'username':
+        usernames = usernames[1:]
+    return unique(usernames)
+
+
+def resolve_usernames(usernames):
+    """
+    Map the given usernames to user IDs with a single query; unknown usernames are left out.
+    """
+    return dict(CustomUser.objects.filter(username__in=usernames).values_list('username', 'id'))
+
+
+def bulk_follow(user, usernames, batch_size=BATCH_SIZE):
+    """
+    Make a user follow many users at once.
+
+    Usernames are resolved with one query, the existing follows are read with another one, and
+    the missing follows are inserted in batches, along with the timeline backfill, in a single
+    transaction. The feed and follow graph caches of the users involved are then invalidated.
+
+    Parameters:
+    user: User object
+        The follower.
+    usernames: list of str
+        The users to follow.
+    batch_size: int
+        Number of follows inserted per query.
+
+    Returns:
+    dict
+        The outcome of each username: `FOLLOWED`, `ALREADY_FOLLOWED`, `NOT_FOUND` or `SELF`.
+    """
+    usernames = unique(usernames)
+    user_ids = resolve_usernames(usernames)
+    followed_ids = set(UserFollows.objects.filter(user=user, followed_user_id__in=user_ids.values())
+                       .values_list('followed_user_id', flat=True))
+
+    results, new_ids = {}, []
+    for username in usernames:
+        user_id = user_ids.get(username)
+        if user_id is None:
+            results[username] = NOT_FOUND
+        elif user_id == user.id:
+            results[username] = SELF
+        elif user_id in followed_ids:
+            results[username] = ALREADY_FOLLOWED
+        else:
+            results[username] = FOLLOWED
+            new_ids.append(user_id)
+
+    if new_ids:
+        with transaction.atomic():
+            for start in range(0, len(new_ids), batch_size):
+                UserFollows.objects.bulk_create(
+                    [UserFollows(user=user, followed_user_id=user_id) for user_id in new_ids[start:start + batch_size]],
+                    ignore_conflicts=True
+                )
+            backfill_timeline(user.id, *new_ids)
+
+        # Bulk inserts send no signal, so the caches are invalidated here
+        bump_feed_version(user.id)
+        invalidate_follows(user.id, *new_ids)
+    return results
+
+
+def bulk_unfollow(user, usernames):
+    """
+    Make a user unfollow many users at once.
+
+    Returns:
+    dict
+        The outcome of each username: `UNFOLLOWED`, `NOT_FOLLOWED`, `NOT_FOUND` or `SELF`.
+    """
+    usernames = unique(usernames)
+    user_ids = resolve_usernames(usernames)
+    follows = UserFollows.objects.filter(user=user, followed_user_id__in=user_ids.values())
+    followed_ids = set(follows.values_list('followed_user_id', flat=True))
+
+    results = {}
+    for username in usernames:
+        user_id = user_ids.get(username)
+        if user_id is None:
+            results[username] = NOT_FOUND
+        elif user_id == user.id:
+            results[username] = SELF
+        elif user_id in followed_ids:
+            results[username] = UNFOLLOWED
+        else:
+            results[username] = NOT_FOLLOWED
+
+    if followed_ids:
+        with transaction.atomic():
+            follows.delete()
+            trim_timeline(user.id, *followed_ids)
+        bump_feed_version(user.id)
+        invalidate_follows(user.id, *followed_ids)
+    return results
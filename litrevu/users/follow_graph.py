@@ -0,0 +1,102 @@
+from django.conf import settings
+from django.core.cache import cache
+from feed.replicas import read_from_primary
+from users.models import UserFollows
+
+FOLLOWING = 'following'
+FOLLOWERS = 'followers'
+
+
+def follow_list_key(direction, user_id):
+    return f"users:{direction}:{user_id}"
+
+
+def load_follow_list(direction, user_id):
+    """
+    Read the users followed by a user, or their followers, in follow order.
+
+    Parameters:
+    direction: str
+        `FOLLOWING` or `FOLLOWERS`.
+    user_id: int
+        The user whose follows are read.
+
+    Returns:
+    list of tuples
+        `(id, username)` of each user.
+    """
+    if direction == FOLLOWING:
+        follows = UserFollows.objects.filter(user_id=user_id).values_list('followed_user_id',
+                                                                          'followed_user__username')
+    else:
+        follows = UserFollows.objects.filter(followed_user_id=user_id).values_list('user_id', 'user__username')
+    return list(follows.order_by('id'))
+
+
+def get_follow_list(direction, user_id):
+    """
+    Return the users followed by a user, or their followers, from the cache, loading them on a miss.
+
+    Both lists are cached under their own key, so that the feed, which only needs the followed
+    users, never loads the followers of a popular user, and a new follower does not invalidate
+    the list of the users they follow. The lists are only cached with a cache shared by all the
+    server processes (`SHARED_CACHE`), which the invalidations of one process must reach; misses
+    are loaded from the primary database, which the cached lists must reflect.
+
+    The entries are invalidated whenever a follow is created or deleted, see `users.signals`.
+
+    Returns:
+    list of tuples
+        See `load_follow_list`.
+    """
+    if not settings.SHARED_CACHE:
+        return load_follow_list(direction, user_id)
+
+    key = follow_list_key(direction, user_id)
+    follows = cache.get(key)
+    if follows is None:
+        with read_from_primary():
+            follows = load_follow_list(direction, user_id)
+        cache.set(key, follows, settings.FOLLOW_GRAPH_CACHE_TIMEOUT)
+    return follows
+
+
+def get_follow_graph(user_id):
+    """
+    Return both the users followed by a user and their followers, see `get_follow_list`.
+
+    Returns:
+    dict
+        `following` and `followers` map to lists of `(id, username)` tuples, in follow order.
+    """
+    return {FOLLOWING: get_follow_list(FOLLOWING, user_id), FOLLOWERS: get_follow_list(FOLLOWERS, user_id)}
+
+
+def get_followed_ids(user_id):
+    """
+    Return the set of IDs of the users followed by a user.
+    """
+    return {followed_id for followed_id, _ in get_follow_list(FOLLOWING, user_id)}
+
+
+def get_follower_ids(user_id):
+    """
+    Return the set of IDs of the users following a user.
+    """
+    return {follower_id for follower_id, _ in get_follow_list(FOLLOWERS, user_id)}
+
+
+def invalidate_follows(user_id, *followed_user_ids):
+    """
+    Drop the cached lists changed by follows of a user: their following list and the followers of the others.
+    """
+    cache.delete_many([follow_list_key(FOLLOWING, user_id),
+                       *(follow_list_key(FOLLOWERS, followed_id) for followed_id in followed_user_ids)])
+
+
+def invalidate_follow_graph(*user_ids):
+    """
+    Drop both cached lists of some users, e.g. the neighbours of a user whose username changed.
+    """
+    cache.delete_many([follow_list_key(direction, user_id)
+                       for user_id in user_ids for direction in (FOLLOWING, FOLLOWERS)])
@@ -0,0 +1,57 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from feed.timeline import BATCH_SIZE
+from users.bulk_follows import bulk_follow
+from users.bulk_follows import bulk_unfollow
+from users.bulk_follows import read_usernames_csv
+from users.bulk_follows import unique
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    """
+    Make a user follow (or unfollow) a list of users, e.g. when migrating a community.
+
+    Usernames are given on the command line and/or in CSV files (one username per row, in the
+    first column). They are resolved with a single query and the follows are inserted in batches
+    within one transaction. The outcome of every username is printed.
+    """
+    help = "Follow or unfollow many users at once, from a list or CSV files of usernames."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help="The user who follows the others.")
+        parser.add_argument('usernames', nargs='*', help="The users to follow.")
+        parser.add_argument('--file', action='append', dest='files', default=[],
+                            help="CSV file of usernames to follow (repeatable).")
+        parser.add_argument('--unfollow', action='store_true', help="Unfollow the users instead.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help="Number of follows inserted per query.")
+
+    def handle(self, *args, **options):
+        try:
+            user = CustomUser.objects.get(username=options['username'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"The user {options['username']} does not exist.")
+
+        usernames = list(options['usernames'])
+        for path in options['files']:
+            try:
+                with open(path, newline='', encoding='utf-8-sig') as file:
+                    usernames += read_usernames_csv(file)
+            except (OSError, UnicodeDecodeError) as error:
+                raise CommandError(f"Cannot read {path}: {error}")
+        usernames = unique(usernames)
+        if not usernames:
+            raise CommandError("No username to follow was given.")
+
+        if options['unfollow']:
+            results = bulk_unfollow(user, usernames)
+        else:
+            results = bulk_follow(user, usernames, options['batch_size'])
+
+        for username, result in results.items():
+            self.stdout.write(f"{username}: {result}")
+        summary = ", ".join(f"{count} {result}" for result, count in Counter(results.values()).items())
+        self.stdout.write(self.style.SUCCESS(f"{len(results)} username(s) processed: {summary}."))
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.5 on 2026-10-18 18:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_userfollows"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="userfollows",
+            index=models.Index(
+                fields=["followed_user", "user"], name="userfollows_followed_user_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.5 on 2026-10-18 18:39
+
+from django.db import migrations, models
+
+
+def fill_username_normalized(apps, schema_editor):
+    CustomUser = apps.get_model("users", "CustomUser")
+    manager = CustomUser.objects.db_manager(schema_editor.connection.alias)
+    users = manager.only("id", "username").order_by("id")
+    batch = []
+    for user in users.iterator(chunk_size=1000):
+        user.username_normalized = user.username.lower()
+        batch.append(user)
+        if len(batch) >= 1000:
+            manager.bulk_update(batch, ["username_normalized"])
+            batch = []
+    if batch:
+        manager.bulk_update(batch, ["username_normalized"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0003_userfollows_followed_user_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="username_normalized",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=150
+            ),
+        ),
+        migrations.RunPython(fill_username_normalized, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.mixins import LoginRequiredMixin
+
+
+class AsyncLoginRequiredMixin(LoginRequiredMixin):
+    """
+    Verify that the current user is authenticated, for views whose handlers are coroutines.
+
+    `request.user` is a lazy object loaded from the session and the database on first access,
+    which is not allowed from the event loop. It is resolved in a worker thread before the
+    regular `LoginRequiredMixin` check runs.
+    """
+    async def dispatch(self, request, *args, **kwargs):
+        # Resolve the lazy user outside of the event loop
+        await sync_to_async(lambda: request.user.is_authenticated)()
+
+        response = super().dispatch(request, *args, **kwargs)
+        if not hasattr(response, '__await__'):
+            # The user is not authenticated and was redirected to the login page
+            return response
+        return await response
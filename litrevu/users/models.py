@@ -4,9 +4,26 @@ from django.db import models
 from django.conf import settings
 
 
+def normalize_username(username):
+    """
+    Normalize a username for case-insensitive prefix searches.
+    """
+    return username.lower()
+
+
 class CustomUser(AbstractUser):
+    # Lowercase copy of the username, indexed for the autocomplete range queries
+    username_normalized = models.CharField(max_length=150, db_index=True, editable=False, default='')
+
     objects = UserManager()
 
+    def save(self, *args, **kwargs):
+        self.username_normalized = normalize_username(self.username)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'username' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'username_normalized'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.username
 
@@ -22,6 +39,9 @@ class UserFollows(models.Model):
 
     class Meta:
         unique_together = ('user', 'followed_user')
+        indexes = [
+            models.Index(fields=['followed_user', 'user'], name='userfollows_followed_user_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} follows {self.followed_user.username}"
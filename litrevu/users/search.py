@@ -0,0 +1,74 @@
+from difflib import get_close_matches
+
+from users.models import CustomUser
+from users.models import normalize_username
+
+# Number of usernames sharing the first letters of the query that fuzzy matching considers
+FUZZY_CANDIDATES = 100
+FUZZY_PREFIX_LENGTH = 2
+
+
+def get_prefix_upper_bound(prefix):
+    """
+    Return the smallest string greater than every string starting with `prefix`.
+
+    `abc` gives `abd`, so that `prefix <= value < upper bound` selects the values starting with
+    the prefix with a range scan on an index, unlike `LIKE 'abc%'`.
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def filter_username_prefix(queryset, prefix, field='username_normalized'):
+    """
+    Keep the users whose normalized username starts with `prefix`, with a range on its index.
+
+    `field` is the path of the normalized username from the model of the queryset.
+    """
+    prefix = normalize_username(prefix)
+    return queryset.filter(**{f'{field}__gte': prefix, f'{field}__lt': get_prefix_upper_bound(prefix)})
+
+
+def prefix_queryset(prefix, exclude_id=None):
+    """
+    Select the active users whose normalized username starts with `prefix`, in alphabetical order.
+    """
+    users = filter_username_prefix(CustomUser.objects.filter(is_active=True), prefix)
+    if exclude_id is not None:
+        users = users.exclude(id=exclude_id)
+    return users.order_by('username_normalized').values_list('username', flat=True)
+
+
+def search_usernames(query, limit=10, exclude_id=None):
+    """
+    Suggest usernames for a partially typed query, for the autocomplete of the follow form.
+
+    Usernames starting with the query (case-insensitively) come first. When there are fewer
+    than `limit` of them, the list is filled with close matches among the usernames sharing
+    the first letters of the query, to tolerate typos. Both lookups are range scans on the
+    `username_normalized` index, reading at most `limit` and `FUZZY_CANDIDATES` rows.
+
+    Parameters:
+    query: str
+        The text typed by the user.
+    limit: int
+        The maximum number of suggestions.
+    exclude_id: int, optional
+        A user to leave out, typically the one searching.
+
+    Returns:
+    list of str
+        The suggested usernames.
+    """
+    query = normalize_username(query.strip())
+    if not query or limit <= 0:
+        return []
+
+    results = list(prefix_queryset(query, exclude_id)[:limit])
+    if len(results) >= limit or len(query) <= FUZZY_PREFIX_LENGTH:
+        return results
+
+    candidates = {normalize_username(username): username
+                  for username in prefix_queryset(query[:FUZZY_PREFIX_LENGTH], exclude_id)[:FUZZY_CANDIDATES]
+                  if username not in results}
+    matches = get_close_matches(query, candidates, n=limit - len(results), cutoff=0.6)
+    return results + [candidates[match] for match in matches]
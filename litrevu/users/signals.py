@@ -0,0 +1,43 @@
+from django.db.models import Q
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from users.backends import invalidate_cached_user
+from users.follow_graph import invalidate_follow_graph
+from users.follow_graph import invalidate_follows
+from users.models import CustomUser
+from users.models import UserFollows
+
+
+@receiver(post_save, sender=UserFollows)
+@receiver(post_delete, sender=UserFollows)
+def invalidate_follow_graphs(sender, instance, **kwargs):
+    """
+    Invalidate the cached following list of the follower and followers list of the followed user.
+    """
+    invalidate_follows(instance.user_id, instance.followed_user_id)
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_neighbour_graphs(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Invalidate the follow graphs displaying the username of a user, in case it changed.
+
+    Saves that cannot touch the username, such as the `last_login` update, are skipped.
+    """
+    if created or (update_fields is not None and 'username' not in update_fields):
+        return
+    neighbours = UserFollows.objects.filter(Q(user=instance) | Q(followed_user=instance))
+    user_ids = {instance.pk}
+    for follower_id, followed_id in neighbours.values_list('user_id', 'followed_user_id'):
+        user_ids.update((follower_id, followed_id))
+    invalidate_follow_graph(*user_ids)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_user_cache(sender, instance, **kwargs):
+    """
+    Drop the cached copy of a user whose profile, password or login date changed, or who was deleted.
+    """
+    invalidate_cached_user(instance.pk)
@@ -1,3 +1,129 @@
-# from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+from feed.models import Ticket
+from feed.models import TimelineEntry
+from users import bulk_follows
+from users.backends import CachedModelBackend
+from users.bulk_follows import bulk_follow
+from users.bulk_follows import bulk_unfollow
+from users.bulk_follows import parse_usernames
+from users.bulk_follows import read_usernames_csv
+from users.follow_graph import FOLLOWERS
+from users.follow_graph import FOLLOWING
+from users.follow_graph import follow_list_key
+from users.follow_graph import get_follow_graph
+from users.follow_graph import get_followed_ids
+from users.follow_graph import get_follower_ids
+from users.models import CustomUser
+from users.models import UserFollows
 
-# Create your tests here.
+
+class BulkFollowTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='reader', password='password')
+        cls.authors = [CustomUser.objects.create_user(username=f'author{index}', password='password')
+                       for index in range(3)]
+        Ticket.objects.create(user=cls.authors[0], title="Ticket")
+
+    def setUp(self):
+        # The follow graphs cached by a test must not outlive its rolled back follows
+        cache.clear()
+
+    def test_parse_usernames(self):
+        self.assertEqual(parse_usernames("a, b;c\n a  d"), ['a', 'b', 'c', 'd'])
+
+    def test_read_usernames_csv_skips_header(self):
+        self.assertEqual(read_usernames_csv(["username,note\n", "a,x\n", "b\n", "a\n"]), ['a', 'b'])
+
+    def test_bulk_follow_reports_every_username(self):
+        UserFollows.objects.create(user=self.user, followed_user=self.authors[1])
+        results = bulk_follow(self.user, ['author0', 'author1', 'reader', 'nobody'])
+        self.assertEqual(results, {
+            'author0': bulk_follows.FOLLOWED,
+            'author1': bulk_follows.ALREADY_FOLLOWED,
+            'reader': bulk_follows.SELF,
+            'nobody': bulk_follows.NOT_FOUND,
+        })
+
+    def test_bulk_follow_inserts_in_batches_and_backfills(self):
+        bulk_follow(self.user, [author.username for author in self.authors], batch_size=2)
+        self.assertEqual(get_followed_ids(self.user.id), {author.id for author in self.authors})
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.user, author=self.authors[0]).exists())
+
+    def test_bulk_follow_invalidates_the_follow_graph(self):
+        self.assertEqual(get_follower_ids(self.authors[0].id), set())
+        bulk_follow(self.user, ['author0'])
+        self.assertEqual(get_follower_ids(self.authors[0].id), {self.user.id})
+
+    def test_bulk_unfollow(self):
+        bulk_follow(self.user, ['author0', 'author1'])
+        results = bulk_unfollow(self.user, ['author0', 'author2'])
+        self.assertEqual(results, {'author0': bulk_follows.UNFOLLOWED, 'author2': bulk_follows.NOT_FOLLOWED})
+        self.assertEqual(get_followed_ids(self.user.id), {self.authors[1].id})
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.user, author=self.authors[0]).exists())
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['users.backends.CachedModelBackend'],
+                   SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+class CachedModelBackendTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='reader', password='password')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_user_is_read_without_query(self):
+        backend = CachedModelBackend()
+        backend.get_user(self.user.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(backend.get_user(self.user.id), self.user)
+
+    def test_deactivated_user_is_dropped_from_the_cache(self):
+        backend = CachedModelBackend()
+        backend.get_user(self.user.id)
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(backend.get_user(self.user.id))
+
+    def test_password_change_logs_the_sessions_out(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('feed')).status_code, 200)
+        self.user.set_password('new password')
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('feed')).status_code, 302)
+
+
+class FollowGraphTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.star = CustomUser.objects.create_user(username='star', password='password')
+        cls.reader = CustomUser.objects.create_user(username='reader', password='password')
+        UserFollows.objects.create(user=cls.star, followed_user=cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_not_cached_without_a_shared_cache(self):
+        with override_settings(SHARED_CACHE=False):
+            get_follow_graph(self.star.id)
+        self.assertIsNone(cache.get(follow_list_key(FOLLOWING, self.star.id)))
+
+    @override_settings(SHARED_CACHE=True)
+    def test_followed_ids_do_not_load_the_followers(self):
+        self.assertEqual(get_followed_ids(self.star.id), {self.reader.id})
+        self.assertIsNotNone(cache.get(follow_list_key(FOLLOWING, self.star.id)))
+        self.assertIsNone(cache.get(follow_list_key(FOLLOWERS, self.star.id)))
+
+    @override_settings(SHARED_CACHE=True)
+    def test_new_follower_keeps_the_following_list_cached(self):
+        get_follow_graph(self.star.id)
+        UserFollows.objects.create(user=self.reader, followed_user=self.star)
+        self.assertIsNotNone(cache.get(follow_list_key(FOLLOWING, self.star.id)))
+        with self.assertNumQueries(1):
+            graph = get_follow_graph(self.star.id)
+        self.assertEqual(graph[FOLLOWERS], [(self.reader.id, 'reader')])
+        self.assertEqual(graph[FOLLOWING], [(self.reader.id, 'reader')])
@@ -1,18 +1,41 @@
+from io import TextIOWrapper
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth import authenticate
 from django.contrib.auth import login
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import LogoutView
+from django.core.exceptions import BadRequest
+from django.http import JsonResponse
 from django.shortcuts import redirect
 from django.shortcuts import render
 from django.urls import reverse_lazy
 from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
 from django.views.decorators.http import require_POST
 from django.views.generic import View
 from django.views.generic import FormView
 from django.db import IntegrityError
+from feed.fragments import bump_feed_version
+from feed.freshness import conditional_page
+from feed.freshness import get_request_parts
+from feed.freshness import has_pending_messages
+from feed.freshness import make_etag
+from feed.replicas import ReplicaReadMixin
+from feed.timeline import backfill_timeline
+from feed.timeline import trim_timeline
 from users import forms
+from users.bulk_follows import bulk_follow
+from users.bulk_follows import bulk_unfollow
+from users.bulk_follows import parse_usernames
+from users.bulk_follows import read_usernames_csv
+from users.bulk_follows import unique
+from users.follow_graph import get_follow_graph
+from users.follow_graph import invalidate_follows
+from users.mixins import AsyncLoginRequiredMixin
 from users.models import UserFollows, CustomUser
+from users.search import search_usernames
 
 
 class LoginView(View):
@@ -107,7 +130,28 @@ class SignupView(FormView):
         return super().form_valid(form)
 
 
-class FollowedUsersView(LoginRequiredMixin, View):
+def followed_users_etag(request, *args, **kwargs):
+    """
+    Compute the ETag of the subscriptions page from the cached follow graph of the user.
+
+    The page is always rendered while messages are pending, since they are displayed only once.
+    """
+    if has_pending_messages(request):
+        return None
+
+    graph = get_follow_graph(request.user.id)
+    return make_etag(*get_request_parts(request), graph['following'], graph['followers'])
+
+
+def get_followed_users_context(graph):
+    """
+    Build the context of the subscriptions page from a follow graph, see `users.follow_graph`.
+    """
+    return {'followed_users': [{'id': user_id, 'username': username} for user_id, username in graph['following']],
+            'followers': [{'id': user_id, 'username': username} for user_id, username in graph['followers']]}
+
+
+class FollowedUsersView(LoginRequiredMixin, ReplicaReadMixin, View):
     """
     FollowedUsersView is a class-based view that renders a list of users that the
     currently authenticated user is following.
@@ -118,14 +162,27 @@ class FollowedUsersView(LoginRequiredMixin, View):
     Methods
     -------
     get(self, request, *args, **kwargs):
-        Handles GET requests. Retrieves and renders a list of followed users for the
-        currently authenticated user.
+        Handles GET requests. Retrieves and renders the lists of followed users and of
+        followers for the currently authenticated user.
     """
+    @conditional_page(followed_users_etag)
     def get(self, request, *args, **kwargs):
-        followed_users = UserFollows.objects.filter(user=request.user)
+        # Read both lists from the cached follow graph of the user.
         return render(request,
                       'users/followed_users.html',
-                      {'followed_users': followed_users})
+                      get_followed_users_context(get_follow_graph(request.user.id)))
+
+
+class AsyncFollowedUsersView(AsyncLoginRequiredMixin, FollowedUsersView):
+    """
+    Asynchronous version of `FollowedUsersView`, reading the follow graph outside of the event loop.
+    """
+    async def get(self, request, *args, **kwargs):
+        # Read both lists from the cached follow graph of the user
+        graph = await sync_to_async(get_follow_graph)(request.user.id)
+        return await sync_to_async(render)(request,
+                                           'users/followed_users.html',
+                                           get_followed_users_context(graph))
 
 
 class FollowUserView(LoginRequiredMixin, View):
@@ -161,6 +218,11 @@ class FollowUserView(LoginRequiredMixin, View):
             # Create a new follow relationship.
             UserFollows.objects.create(user=request.user, followed_user=user_to_follow)
 
+            # Copy the existing posts of the followed user into the follower's timeline.
+            backfill_timeline(request.user.id, user_to_follow.id)
+            bump_feed_version(request.user.id)
+            invalidate_follows(request.user.id, user_to_follow.id)
+
             # Send a success message to the user.
             messages.success(request, f"You are now following {user_to_follow.username}!")
         except CustomUser.DoesNotExist:
@@ -193,6 +255,11 @@ class UnfollowUserView(LoginRequiredMixin, View):
             # Delete the following relationship.
             follow.delete()
 
+            # Remove the posts of the unfollowed user from the follower's timeline.
+            trim_timeline(request.user.id, pk)
+            bump_feed_version(request.user.id)
+            invalidate_follows(request.user.id, pk)
+
             # Send a success message to the user.
             messages.success(request, f"You have unfollowed {followed_username}.")
         else:
@@ -201,3 +268,67 @@ class UnfollowUserView(LoginRequiredMixin, View):
 
         # Redirect the user back to the 'abonnements' page.
         return redirect('abonnements')
+
+
+class BulkFollowView(LoginRequiredMixin, View):
+    """
+    View to follow or unfollow many users in a single request.
+
+    The view accepts POST requests with a list of usernames, in the `usernames` field
+    (separated by commas or new lines) and/or in an uploaded CSV file named `file` (one
+    username per row, in the first column). The `action` field is either `follow` (the
+    default) or `unfollow`. The outcome for each username is returned as JSON.
+    """
+    raise_exception = True
+    max_usernames = 5000
+
+    def get_usernames(self, request):
+        """
+        Collect the usernames of the text field and of the uploaded CSV file.
+        """
+        usernames = parse_usernames(request.POST.get('usernames', ''))
+        if 'file' in request.FILES:
+            try:
+                usernames += read_usernames_csv(TextIOWrapper(request.FILES['file'], encoding='utf-8-sig'))
+            except UnicodeDecodeError:
+                raise BadRequest("The file must be a UTF-8 encoded CSV file.")
+        return unique(usernames)
+
+    @method_decorator(require_POST)
+    def post(self, request, *args, **kwargs):
+        action = request.POST.get('action', 'follow')
+        if action not in ('follow', 'unfollow'):
+            raise BadRequest("The action must be 'follow' or 'unfollow'.")
+
+        usernames = self.get_usernames(request)
+        if len(usernames) > self.max_usernames:
+            raise BadRequest(f"At most {self.max_usernames} usernames can be sent at once.")
+
+        # Create or delete all the follow relationships at once
+        if action == 'follow':
+            results = bulk_follow(request.user, usernames)
+        else:
+            results = bulk_unfollow(request.user, usernames)
+        return JsonResponse({'results': results})
+
+
+class UsernameAutocompleteView(LoginRequiredMixin, ReplicaReadMixin, View):
+    """
+    View suggesting usernames for the follow form.
+
+    It answers GET requests with the usernames matching the `q` parameter as JSON, see
+    `users.search.search_usernames`. The number of suggestions can be lowered with `limit`.
+    """
+    raise_exception = True
+    max_results = 10
+
+    @method_decorator(cache_control(private=True, max_age=60))
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = min(int(request.GET.get('limit', self.max_results)), self.max_results)
+        except ValueError:
+            raise BadRequest("The limit must be an integer.")
+
+        # Search the usernames, leaving out the user, who cannot follow themselves
+        results = search_usernames(request.GET.get('q', ''), limit=limit, exclude_id=request.user.id)
+        return JsonResponse({'results': results})